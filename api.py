@@ -0,0 +1,216 @@
+# api.py
+"""Async HTTP API over the same pipeline as the Streamlit app.
+
+Run with `python cli.py serve` or `uvicorn api:app`. Blocking work (Chroma,
+embeddings, LLM calls) runs in worker threads; ASK_CONCURRENCY bounds how
+many questions are answered at once. Uploads are queued on the same
+persistent ingestion queue as the app and processed by its worker pool.
+"""
+import asyncio
+import json
+import os
+import queue
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool
+from utils.batch_qa import BATCH_LLM_CONCURRENCY, BATCH_LLM_RATE, answer_batch, read_questions
+from utils.headless import (BATCH_CONCURRENCY, answer_question, find_pdfs, queue_path, resolve_ingest_path,
+                            run_batch, save_upload)
+from utils.jobs import get_job_queue, start_ingest_workers
+from utils.metrics import get_metrics, start_exporters
+from utils.resources import warm_up
+
+# Questions answered concurrently across all requests
+ASK_CONCURRENCY = 8
+# Upload body blocks buffered between the event loop and the thread writing the file
+UPLOAD_QUEUE_BLOCKS = 16
+UPLOAD_POLL_INTERVAL = 0.01
+# Server-side paths may only be ingested from inside this directory
+INGEST_ROOT = os.environ.get('PDF_CHATBOT_INGEST_ROOT', 'data/inbox')
+
+
+class AskRequest(BaseModel):
+    question: str
+    chat_history: List[Tuple[str, str]] = []
+    response_style: str = "Formal"
+    language: str = "English"
+    pdf_name: Optional[str] = None
+    tags: List[str] = []
+
+
+class IngestPathRequest(BaseModel):
+    path: str
+    tags: List[str] = []
+    version_of: Optional[str] = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    warm_up()
+    start_exporters()
+    start_ingest_workers()
+    app.state.ask_slots = asyncio.Semaphore(ASK_CONCURRENCY)
+    yield
+
+
+app = FastAPI(title="PDF Chatbot API", lifespan=lifespan)
+
+
+@app.post("/ask")
+async def ask(body: AskRequest, request: Request):
+    filters = {}
+    if body.pdf_name:
+        filters['pdf_name'] = body.pdf_name
+    if body.tags:
+        filters['tags'] = body.tags
+    async with request.app.state.ask_slots:
+        return await asyncio.to_thread(
+            answer_question, body.question, body.chat_history, body.response_style, body.language, filters
+        )
+
+
+@app.post("/documents")
+async def upload_document(request: Request, filename: str, tags: str = "", version_of: Optional[str] = None):
+    """Upload a PDF as the raw request body (?filename=report.pdf&tags=a,b); it is queued for ingestion.
+
+    Pass version_of (a stored doc_key) to replace that document instead of adding a new one.
+    """
+    # Body blocks go through a bounded queue to a worker thread that writes and
+    # hashes them as they arrive, so at most UPLOAD_QUEUE_BLOCKS are held in memory
+    blocks = queue.Queue(maxsize=UPLOAD_QUEUE_BLOCKS)
+
+    def read_blocks():
+        while True:
+            block = blocks.get()
+            if block is None:
+                return
+            if isinstance(block, BaseException):
+                raise block
+            yield block
+
+    saving = asyncio.ensure_future(asyncio.to_thread(
+        save_upload, read_blocks(), filename, [tag.strip() for tag in tags.split(',') if tag.strip()], version_of
+    ))
+
+    async def feed(item):
+        # Stop feeding if the writer has already failed
+        while not saving.done():
+            try:
+                blocks.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(UPLOAD_POLL_INTERVAL)
+
+    try:
+        async for block in request.stream():
+            await feed(block)
+    except BaseException as e:
+        # Client went away mid-upload: make the writer discard the partial file
+        await feed(e)
+        await asyncio.gather(saving, return_exceptions=True)
+        raise
+    await feed(None)
+    status, job_id = await saving
+    return {'status': status, 'job_id': job_id}
+
+
+@app.post("/documents/path")
+def ingest_path(body: IngestPathRequest):
+    """Queue a file or every PDF in a directory under INGEST_ROOT for ingestion.
+
+    Files whose content is already ingested or queued are reported as
+    duplicates. A plain def, so FastAPI runs the directory walk, hashing and
+    SQLite writes in its threadpool.
+    """
+    try:
+        path = resolve_ingest_path(body.path, INGEST_ROOT)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if os.path.isdir(path):
+        if body.version_of:
+            raise HTTPException(status_code=400, detail="version_of needs a single file")
+        paths = find_pdfs(path)
+    elif os.path.isfile(path):
+        paths = [path]
+    else:
+        raise HTTPException(status_code=404, detail="Path not found")
+    results = []
+    for path in paths:
+        status, job_id = queue_path(path, tags=body.tags, version_of=body.version_of)
+        results.append({'path': path, 'status': status, 'job_id': job_id})
+    job_ids = [result['job_id'] for result in results if result['status'] == 'queued']
+    return {'status': 'queued', 'job_ids': job_ids, 'files': results}
+
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 20):
+    return await asyncio.to_thread(get_job_queue().list_jobs, limit)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int):
+    job = await asyncio.to_thread(get_job_queue().get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int):
+    await asyncio.to_thread(get_job_queue().cancel, job_id)
+    return {'job_id': job_id}
+
+
+@app.get("/recommendations")
+async def recommendations(query: str, k: int = 5):
+    from utils.recommendations import get_recommendations
+    return {'query': query, 'pdf_names': await asyncio.to_thread(get_recommendations, query, k)}
+
+
+@app.get("/recommendations/similar")
+async def similar_documents(pdf_name: str, k: int = 5):
+    from utils.recommendations import get_similar_documents
+    return {'pdf_name': pdf_name, 'pdf_names': await asyncio.to_thread(get_similar_documents, [pdf_name], k)}
+
+
+@app.post("/summary")
+async def summary():
+    from utils.summarization import summarize_documents
+    return {'summary': await asyncio.to_thread(summarize_documents)}
+
+
+@app.post("/batch")
+async def batch(request: Request, concurrency: int = BATCH_CONCURRENCY):
+    """Run a JSONL request body (one {"op": ...} per line); results stream back as JSONL."""
+    lines = (await request.body()).decode('utf-8').splitlines()
+    results = iterate_in_threadpool(
+        json.dumps(result, ensure_ascii=False) + '\n' for result in run_batch(lines, concurrency=concurrency, ingest_root=INGEST_ROOT)
+    )
+    return StreamingResponse(results, media_type='application/x-ndjson')
+
+
+@app.post("/qa/batch")
+async def qa_batch(request: Request, concurrency: int = BATCH_LLM_CONCURRENCY, rate: float = BATCH_LLM_RATE):
+    """Answer a JSONL body of questions with batched embedding and retrieval; answers stream back as JSONL."""
+    try:
+        items = read_questions((await request.body()).decode('utf-8').splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    results = iterate_in_threadpool(
+        json.dumps(result, ensure_ascii=False) + '\n'
+        for result in answer_batch(items, concurrency=concurrency, rate=rate)
+    )
+    return StreamingResponse(results, media_type='application/x-ndjson')
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(get_metrics().render_prometheus(), media_type='text/plain; version=0.0.4')
+
+
+@app.get("/health")
+async def health():
+    return {'status': 'ok'}
@@ -4,19 +4,28 @@ import os
 import base64
 import re
 import json
+import uuid
 from datetime import datetime
-from utils.pdf_handler import process_and_store_pdf,display_pdf
-from utils.retrieval import get_answer_conversational
+from utils.pdf_handler import display_pdf
+from utils.pdf_viewer import cited_pages
+from utils.jobs import get_job_queue, start_ingest_workers
+from utils.upload_manifest import register_upload
+from utils.retrieval import get_answer_conversational, stream_answer_conversational
 from utils.summarization import summarize_documents
-from utils.annotations import load_annotations, save_annotation
-from utils.recommendations import get_recommendations
-from utils.chroma_manager import get_chroma_client
-from utils.security import encrypt_pdf, decrypt_pdf, load_key
+from utils.annotations import load_annotations, save_annotation, get_annotation_store, ANNOTATIONS_PAGE_SIZE
+from utils.recommendations import get_recommendations, get_similar_documents
+from utils.chroma_manager import get_collection, browse_documents, count_chunks_by_pdf
+from utils.metadata_index import get_metadata_index, normalize_tags
+from utils.resources import warm_up
+from utils.metrics import get_metrics, start_exporters
+from utils.security import encrypt_pdf, load_key
 from utils.visualization import generate_word_cloud
 from utils.external_data import fetch_external_data
-from utils.answer_audio_handler import generate_audio
+from utils.answer_audio_handler import generate_audio, SpeechPipeline
+from utils.embedding_cache import get_embedding_cache
+from utils.answer_cache import get_answer_cache
+from utils.conversation_store import get_conversation_store, write_report, HISTORY_PAGE_SIZE
 from PIL import Image
-from fpdf import FPDF
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -59,14 +68,20 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+# Create the shared Chroma client, embedder and LLM once per process
+warm_up()
+start_exporters()
+
 # Main title
 st.markdown("<h1>📚 Multi-PDF Chatbot</h1>", unsafe_allow_html=True)
 
-# Initialize session state
-if 'conversation' not in st.session_state:
-    st.session_state.conversation = []
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+# Initialize session state; turns live in the conversation store, keyed by a
+# session id kept in the URL so a reload picks the conversation back up
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = st.query_params.get('session') or uuid.uuid4().hex
+    st.query_params['session'] = st.session_state.session_id
+session_id = st.session_state.session_id
+conversation_store = get_conversation_store()
 
 # Sidebar for PDF Upload
 st.sidebar.header("📁 Upload PDFs")
@@ -75,24 +90,79 @@ uploaded_pdfs = st.sidebar.file_uploader("Choose PDFs", type=['pdf'], accept_mul
 # Input for custom tags
 tags_input = st.sidebar.text_input("Enter tags (comma-separated):")
 
+# A new upload only replaces a stored document when the user says so
+stored_documents = dict(get_metadata_index().list_documents())
+version_of = st.sidebar.selectbox(
+    "New version of (optional):", [None] + list(stored_documents),
+    format_func=lambda doc_key: "— new document —" if doc_key is None
+    else re.sub(r'_[a-f0-9]{8}', '', stored_documents[doc_key] or doc_key)
+)
+
 
-TEMP_PDF_DIR = "data/temp_pdfs"
-if not os.path.exists(TEMP_PDF_DIR):
-    os.makedirs(TEMP_PDF_DIR)
+# Uploads are ingested by background workers; the page only enqueues them.
+# The upload manifest makes reruns with the same files a no-op.
+start_ingest_workers()
 
 if uploaded_pdfs:
     tags = [tag.strip() for tag in tags_input.split(',')] if tags_input else []
-    with st.spinner("Processing PDFs..."):
-        for uploaded_pdf in uploaded_pdfs:
-            # Save the uploaded PDF temporarily
-            temp_pdf_path = os.path.join(TEMP_PDF_DIR, uploaded_pdf.name)
-            with open(temp_pdf_path, 'wb') as f:
-                f.write(uploaded_pdf.getbuffer())
-            
-            # Process and store the PDF with content-based uniqueness
-            process_and_store_pdf(temp_pdf_path, tags=tags)
-
-    st.sidebar.success("PDFs have been processed and stored.")
+    if version_of and len(uploaded_pdfs) > 1:
+        st.sidebar.warning("Upload one file at a time to add it as a new version.")
+        version_of = None
+    for uploaded_pdf in uploaded_pdfs:
+        status, job_id = register_upload(uploaded_pdf, tags=tags, version_of=version_of)
+        if status == 'queued':
+            st.sidebar.info(f"{uploaded_pdf.name} queued for processing.")
+        elif status == 'duplicate':
+            st.sidebar.info(f"{uploaded_pdf.name} is already embedded based on content.")
+
+@st.fragment(run_every=2)
+def show_ingestion_jobs():
+    job_queue = get_job_queue()
+    for job in job_queue.list_jobs(limit=10):
+        st.write(f"**{job['display_name']}** – {job['status']}")
+        if job['status'] == 'running':
+            st.progress(job['progress'], text=job['message'] or "Starting...")
+            if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                job_queue.cancel(job['id'])
+        elif job['status'] == 'queued':
+            if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                job_queue.cancel(job['id'])
+        elif job['status'] in ('failed', 'cancelled'):
+            if job['error']:
+                st.caption(job['error'])
+            if st.button("Retry", key=f"retry_job_{job['id']}"):
+                job_queue.retry(job['id'])
+        elif job['message']:
+            st.caption(job['message'])
+
+with st.sidebar.expander("📋 Ingestion Jobs", expanded=bool(uploaded_pdfs)):
+    show_ingestion_jobs()
+
+# Embedding and answer cache savings
+with st.sidebar.expander("🧮 Cache Stats"):
+    cache_stats = get_embedding_cache().stats()
+    st.write("**Embeddings**")
+    st.write(f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']}")
+    st.write(f"Hit rate: {cache_stats['hit_rate']:.1%} | Cached vectors: {cache_stats['entries']}")
+    cache_stats = get_answer_cache().stats()
+    st.write("**Answers**")
+    st.write(f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']}")
+    st.write(f"Hit rate: {cache_stats['hit_rate']:.1%} | Cached answers: {cache_stats['entries']}")
+
+# Per-stage latency (this process); also exported to data/metrics.prom and data/traces.jsonl
+with st.sidebar.expander("⏱️ Stage Latency"):
+    metrics_snapshot = get_metrics().snapshot()
+    if metrics_snapshot['stages']:
+        st.dataframe(pd.DataFrame([
+            {'Stage': stage, 'Count': stats['count'], 'p50 (ms)': round(stats['p50'] * 1000, 1),
+             'p95 (ms)': round(stats['p95'] * 1000, 1), 'p99 (ms)': round(stats['p99'] * 1000, 1)}
+            for stage, stats in metrics_snapshot['stages'].items()
+        ]), hide_index=True)
+    else:
+        st.write("No timings recorded yet.")
+    for name, value in metrics_snapshot['counters'].items():
+        st.write(f"{name}: {value}")
+    st.download_button("Prometheus metrics", get_metrics().render_prometheus(), file_name="metrics.prom")
 
 # Sidebar Settings
 st.sidebar.header("⚙️ Settings")
@@ -103,22 +173,25 @@ response_style = st.sidebar.selectbox("Response Style:", ["Formal", "Informal",
 # Language
 language = st.sidebar.selectbox("Language:", ["English", "Spanish", "French", "German"])
 
+# Streaming answers (text and audio as they are generated)
+stream_answers = st.sidebar.checkbox("Stream answers", value=True)
+
 # Search Filters
 st.sidebar.header("🔍 Search Filters")
 
-# Filter by PDF Name
+# Filter by PDF Name (prefix, case-insensitive)
 filter_pdf_name = st.sidebar.text_input("Filter by PDF Name:")
 
 # Filter by Tags
 filter_tags_input = st.sidebar.text_input("Filter by Tags (comma-separated):")
 filter_tags = [tag.strip() for tag in filter_tags_input.split(',')] if filter_tags_input else []
 
-# Prepare filters
+# Prepare filters (resolved to candidate chunks through the metadata index)
 filters = {}
 if filter_pdf_name:
     filters['pdf_name'] = filter_pdf_name
 if filter_tags:
-    filters['tags'] = {'$in': filter_tags}
+    filters['tags'] = sorted(normalize_tags(filter_tags))
 
 # Summarize PDFs
 if st.sidebar.button("Summarize All PDFs"):
@@ -130,26 +203,49 @@ if st.sidebar.button("Summarize All PDFs"):
 # Generate Word Cloud
 if st.sidebar.button("Generate Word Cloud"):
     with st.spinner("Generating word cloud..."):
-        wordcloud_fig = generate_word_cloud()
+        # Honour the sidebar PDF name / tag filters
+        wordcloud_fig = generate_word_cloud(pdf_name=filter_pdf_name or None, tags=filter_tags or None)
     st.subheader("🌥️ Word Cloud of PDF Contents")
-    st.pyplot(wordcloud_fig)
+    if wordcloud_fig:
+        st.pyplot(wordcloud_fig)
+    else:
+        st.info("No words found for the selected PDFs.")
 
-# Database Inspection
+# Database Inspection (one page of chunks at a time)
+BROWSE_PAGE_SIZES = [25, 50, 100, 250]
 if st.sidebar.button("Show ChromaDB Content"):
-    client = get_chroma_client()
-    collection = client.get_or_create_collection('pdf_embeddings')
-    results = collection.get()
+    st.session_state.show_db_browser = True
+
+if st.session_state.get('show_db_browser'):
+    st.subheader("ChromaDB Contents")
+    col1, col2, col3 = st.columns(3)
+    page_size = col1.selectbox("Rows per page:", BROWSE_PAGE_SIZES, key='browse_page_size')
+    page_number = col2.number_input("Page:", min_value=1, value=1, step=1, key='browse_page')
+    include_documents = col3.checkbox("Include chunk text", key='browse_documents')
+    results = browse_documents(
+        limit=page_size,
+        offset=(page_number - 1) * page_size,
+        pdf_name=filter_pdf_name or None,
+        tags=filter_tags or None,
+        include_documents=include_documents
+    )
     # Normalize metadata
     metadata_df = pd.json_normalize(results['metadatas'])
     # Create DataFrame
-    df = pd.DataFrame({
-        'ID': results['ids'],
-        'Document': results['documents']
-    })
+    df = pd.DataFrame({'ID': results['ids']})
+    if include_documents:
+        df['Document'] = results['documents']
     df = pd.concat([df, metadata_df], axis=1)
-    st.subheader("ChromaDB Contents")
+    st.caption(f"Total chunks: {get_collection().count()} | Showing {len(df)} from row {(page_number - 1) * page_size + 1}")
     st.dataframe(df)
 
+    if st.checkbox("Show chunk counts per PDF", key='browse_counts'):
+        counts = count_chunks_by_pdf()
+        st.dataframe(pd.DataFrame(sorted(counts.items()), columns=['PDF', 'Chunks']))
+    if st.button("Close ChromaDB Content"):
+        st.session_state.show_db_browser = False
+        st.rerun()
+
 # Main content area
 st.subheader("💬 Ask Questions")
 st.write("Choose how you want to ask the question:")
@@ -184,126 +280,128 @@ elif input_choice == "Type":
     query_input = st.session_state.text_query
 
 
-print(query_input)
-
 if query_input:
     if st.button("Get Answer"):
-        with st.spinner("Searching for the answer..."):
-            answer, source_documents = get_answer_conversational(
-                query_input,
-                st.session_state.chat_history,
-                response_style=response_style,
-                language=language,
-                filters=filters
-            )
-        # Save the question, answer, and source documents to session state
-        st.session_state.conversation.append({
-            'question': query_input,
-            'answer': answer,
-            'source_documents': source_documents
-        })
-        st.session_state.chat_history.append((query_input, answer))
-        st.success("**Answer:**")
-        st.write(answer)
-
-                # Generate and Display the Audio for the Answer
-        st.session_state.generated_audio_file=generate_audio(answer, language=language)
-
-        # Display the generated MP3 file for the user to play
+        if stream_answers:
+            # Show tokens as they arrive and synthesise speech sentence by sentence alongside
+            with st.spinner("Searching for the answer..."):
+                source_documents, answer_tokens = stream_answer_conversational(
+                    query_input,
+                    conversation_store.chat_history(session_id),
+                    response_style=response_style,
+                    language=language,
+                    filters=filters
+                )
+            speech = SpeechPipeline(language=language)
+
+            def speak_as_you_go():
+                for token in answer_tokens:
+                    speech.feed(token)
+                    yield token
+
+            st.success("**Answer:**")
+            answer = st.write_stream(speak_as_you_go())
+            st.session_state.generated_audio_file = speech.close()
+            audio_format = speech.backend.mime_type
+            if speech.errors:
+                st.warning(f"{len(speech.errors)} part(s) of the answer could not be converted to audio: "
+                           f"{speech.errors[0]}")
+        else:
+            with st.spinner("Searching for the answer..."):
+                answer, source_documents = get_answer_conversational(
+                    query_input,
+                    conversation_store.chat_history(session_id),
+                    response_style=response_style,
+                    language=language,
+                    filters=filters
+                )
+            st.success("**Answer:**")
+            st.write(answer)
+
+            # Generate and Display the Audio for the Answer
+            st.session_state.generated_audio_file = generate_audio(answer, language=language)
+            audio_format = 'audio/mp3'
+
+        # Save the question, answer, and source references to the conversation store
+        conversation_store.add(session_id, query_input, answer, source_documents)
+
+        # Display the generated audio file for the user to play
         print(st.session_state.generated_audio_file)
         
         if st.session_state.generated_audio_file:
             audio_file = open(st.session_state.generated_audio_file, "rb")
             audio_bytes = audio_file.read()
-            st.audio(audio_bytes, format='audio/mp3')
-
-        # Display the source PDFs
-        st.subheader("📄 Source PDFs:")
-        pdf_names = set(
-            doc.metadata.get('pdf_name', 'Unknown PDF') for doc in source_documents
-        )
-        for pdf_name in pdf_names:
-            pdf_name_disp = re.sub(r'_[a-f0-9]{8}', '', pdf_name)
-            st.write(f"- **{pdf_name_disp}**")
-            # pdf_base_name = pdf_name.split('_v')[0]
-            # versions = [doc.metadata.get('version', 1) for doc in source_documents if doc.metadata.get('pdf_name') == pdf_name]
-            # selected_version = st.selectbox(f"Select version for {pdf_base_name}:", versions, key=f"version_{pdf_base_name}")
-            # versioned_pdf_name = f"{pdf_base_name}_v{selected_version}.pdf"
-            pdf_path = os.path.join('data/pdfs', pdf_name)
-        
-            if os.path.exists(pdf_path):
-                max_pdf_size = 5 * 1024 * 1024  # 5 MB limit
-                pdf_size = os.path.getsize(pdf_path)
-                if pdf_size <= max_pdf_size:
-                    pdf_name_disp = re.sub(r'_[a-f0-9]{8}', '', pdf_name)
-                    
-                    with st.expander(f"📖 View {pdf_name_disp}"):
-                        # decrypted_pdf = decrypt_pdf(pdf_path)
-                        display_pdf(pdf_path)
-                else:
-                    st.warning(f"{pdf_name} is too large to display. Please download it to view.")
-                    decrypted_pdf = decrypt_pdf(pdf_path)
-                    b64_pdf = base64.b64encode(decrypted_pdf).decode('utf-8')
-                    href = f'<a href="data:application/octet-stream;base64,{b64_pdf}" download="{pdf_name}">📥 Download {pdf_name}</a>'
-                    st.markdown(href, unsafe_allow_html=True)
-            else:
-                st.warning(f"File {pdf_name} not found.")
-
-            # # Annotations
-            # st.subheader(f"✏️ Annotations for {pdf_name}")
-            # annotations = load_annotations()
-            # existing_annotations = annotations.get(pdf_name, [])
-            # st.write("**Existing Annotations:**")
-            # for idx, note in enumerate(existing_annotations):
-            #     st.write(f"{idx + 1}. {note}")
-            # new_annotation = st.text_area(f"Add a new annotation for {pdf_name}:", key=f"annotation_{pdf_name}")
-            # if st.button(f"Save Annotation for {pdf_name}", key=f"save_annotation_{pdf_name}"):
-            #     save_annotation(pdf_name, new_annotation)
-            #     st.success(f"Annotation saved for {pdf_name}.")
-
-        # # AI-Powered Recommendations
-        # recommended_pdfs = get_recommendations(query)
-        # st.subheader("📚 You might also like:")
-        # for pdf in recommended_pdfs:
-        #     st.write(f"- {pdf}")
+            st.audio(audio_bytes, format=audio_format)
     else:
         pass
 
-# Display conversation history
-if st.session_state.conversation:
+# Display the source PDFs of the latest answer; kept outside the button so pages can be browsed
+latest_turn = conversation_store.latest(session_id)
+if latest_turn:
+    sources = latest_turn['sources']
+    st.subheader("📄 Source PDFs:")
+    for pdf_name, pages in cited_pages(sources).items():
+        pdf_name_disp = re.sub(r'_[a-f0-9]{8}', '', pdf_name)
+        pages_disp = f" (pages {', '.join(map(str, pages))})" if pages else ""
+        st.write(f"- **{pdf_name_disp}**{pages_disp}")
+        pdf_path = os.path.join('data/pdfs', pdf_name)
+
+        if os.path.exists(pdf_path):
+            # Pages are rendered only once the viewer is opened
+            if st.toggle(f"📖 View {pdf_name_disp}", key=f"view_{pdf_name}"):
+                display_pdf(pdf_path, pages=pages, key=pdf_name)
+        else:
+            st.warning(f"File {pdf_name} not found.")
+
+        # Annotations
+        with st.expander(f"✏️ Annotations for {pdf_name_disp}"):
+            annotation_store = get_annotation_store()
+            total_notes = annotation_store.count(pdf_name)
+            notes_page = st.number_input("Page", min_value=1, max_value=max(1, -(-total_notes // ANNOTATIONS_PAGE_SIZE)),
+                                         value=1, key=f"annotation_page_{pdf_name}")
+            for note in annotation_store.list(pdf_name, offset=(notes_page - 1) * ANNOTATIONS_PAGE_SIZE):
+                page_disp = f" (p. {note['page']})" if note['page'] else ""
+                st.write(f"{note['id']}. {note['note']}{page_disp}")
+            new_annotation = st.text_area(f"Add a new annotation for {pdf_name_disp}:", key=f"annotation_{pdf_name}")
+            note_page = st.selectbox("About page", [None] + pages, key=f"annotation_about_{pdf_name}")
+            if st.button("Save Annotation", key=f"save_annotation_{pdf_name}") and new_annotation:
+                save_annotation(pdf_name, new_annotation, page=note_page)
+                st.success(f"Annotation saved for {pdf_name_disp}.")
+
+    # Recommendations from the document centroid index; no embedding call needed
+    recommended_pdfs = get_similar_documents(list(cited_pages(sources)))
+    if recommended_pdfs:
+        st.subheader("📚 You might also like:")
+        for pdf in recommended_pdfs:
+            st.write(f"- {re.sub(r'_[a-f0-9]{8}', '', pdf)}")
+
+# Display conversation history, newest first, one page at a time
+total_turns = conversation_store.count(session_id)
+if total_turns:
     st.subheader("📝 Conversation History")
-    for idx, qa in enumerate(st.session_state.conversation):
-        st.write(f"**Q{idx+1}:** {qa['question']}")
-        st.write(f"**A{idx+1}:** {qa['answer']}")
+    history_page = st.number_input("History page", min_value=1,
+                                   max_value=max(1, -(-total_turns // HISTORY_PAGE_SIZE)), value=1)
+    offset = (history_page - 1) * HISTORY_PAGE_SIZE
+    for number, qa in zip(range(total_turns - offset, 0, -1),
+                          conversation_store.list(session_id, offset=offset)):
+        st.write(f"**Q{number}:** {qa['question']}")
+        st.write(f"**A{number}:** {qa['answer']}")
         # Display source PDFs for each QA pair
-        pdf_names = set(
-            doc.metadata.get('pdf_name', 'Unknown PDF') for doc in qa['source_documents']
-        )
-        for pdf_name in pdf_names:
+        for pdf_name in cited_pages(qa['sources']):
             st.write(f"🔗 **Source PDF:** {pdf_name}")
 
+if st.sidebar.button("New Conversation"):
+    st.session_state.session_id = uuid.uuid4().hex
+    st.query_params['session'] = st.session_state.session_id
+    st.rerun()
+
 # Generate Report
 if st.sidebar.button("Generate Report"):
-    report_content = ""
-    for idx, qa in enumerate(st.session_state.conversation):
-        report_content += f"Q{idx+1}: {qa['question']}\n"
-        report_content += f"A{idx+1}: {qa['answer']}\n\n"
-
-    # Export as PDF
-    class PDF(FPDF):
-        def header(self):
-            self.set_font('Arial', 'B', 15)
-            self.cell(0, 10, 'Chatbot Report', ln=True, align='C')
-
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    for line in report_content.split('\n'):
-        pdf.multi_cell(0, 10, line)
-    pdf.output("chatbot_report.pdf")
+    # Turns are read from the store in batches and written to the PDF one by one
+    report_path = write_report(session_id)
 
     # Provide download link
-    with open("chatbot_report.pdf", "rb") as f:
+    with open(report_path, "rb") as f:
         pdf_bytes = f.read()
     b64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
     href = f'<a href="data:application/octet-stream;base64,{b64_pdf}" download="chatbot_report.pdf">📥 Download Report</a>'
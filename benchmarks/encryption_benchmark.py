@@ -0,0 +1,106 @@
+# benchmarks/encryption_benchmark.py
+"""Throughput of the segmented container against the single-token Fernet path.
+
+Usage: python benchmarks/encryption_benchmark.py [--sizes 1 16 64] [--output results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import security  # noqa: E402
+
+RANGE_READ_SIZE = 64 * 1024
+RANGE_READS = 50
+
+
+def measure(fn):
+    """(seconds, peak traced bytes) for one call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def fernet_encrypt(path, key):
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(Fernet(key).encrypt(data))
+
+
+def fernet_range_reads(path, key, offsets):
+    for offset in offsets:
+        with open(path, 'rb') as f:
+            Fernet(key).decrypt(f.read())[offset:offset + RANGE_READ_SIZE]
+
+
+def segmented_range_reads(path, offsets):
+    with security.EncryptedReader(path) as reader:
+        for offset in offsets:
+            reader.seek(offset)
+            reader.read(RANGE_READ_SIZE)
+
+
+def run(sizes_mb, workdir):
+    security.KEY_FILE = os.path.join(workdir, 'secret.key')
+    security.generate_key()
+    key = security.load_key()
+    results = []
+    for size_mb in sizes_mb:
+        size = size_mb * 1024 * 1024
+        plain = os.path.join(workdir, 'plain.pdf')
+        with open(plain, 'wb') as f:
+            f.write(os.urandom(size))
+        offsets = [random.randrange(0, max(1, size - RANGE_READ_SIZE)) for _ in range(RANGE_READS)]
+
+        fernet_path = os.path.join(workdir, 'fernet.pdf')
+        segmented_path = os.path.join(workdir, 'segmented.pdf')
+        for path in (fernet_path, segmented_path):
+            with open(plain, 'rb') as source, open(path, 'wb') as target:
+                target.write(source.read())
+
+        timings = {
+            'fernet_encrypt': measure(lambda: fernet_encrypt(fernet_path, key)),
+            'segmented_encrypt': measure(lambda: security.encrypt_pdf(segmented_path)),
+        }
+        timings['fernet_decrypt'] = measure(lambda: security.decrypt_pdf(fernet_path))
+        timings['segmented_decrypt'] = measure(lambda: sum(len(b) for b in security.iter_decrypted(segmented_path)))
+        timings['fernet_range_reads'] = measure(lambda: fernet_range_reads(fernet_path, key, offsets))
+        timings['segmented_range_reads'] = measure(lambda: segmented_range_reads(segmented_path, offsets))
+
+        for name, (elapsed, peak) in timings.items():
+            result = {'operation': name, 'size_mb': size_mb, 'seconds': round(elapsed, 4),
+                      'peak_memory_mb': round(peak / 1024 / 1024, 2)}
+            if name.endswith('range_reads'):
+                result['reads_per_sec'] = round(RANGE_READS / elapsed, 1)
+            else:
+                result['mb_per_sec'] = round(size_mb / elapsed, 1)
+            results.append(result)
+            print(json.dumps(result))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 16, 64], help="File sizes in MB")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(args.sizes, workdir)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
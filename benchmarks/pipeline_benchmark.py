@@ -0,0 +1,238 @@
+# benchmarks/pipeline_benchmark.py
+"""Offline end-to-end benchmark of ingestion and question answering.
+
+Generates synthetic PDF corpora (text pages plus optional image-only pages
+that go through OCR), swaps in the deterministic LocalEmbedder and a fake
+LLM, and measures ingest throughput, peak RSS, query latency percentiles and
+cache hit rates for each corpus size. Every corpus runs in its own temporary
+data directory, so nothing touches the real data/ folder or the network.
+
+Usage: python benchmarks/pipeline_benchmark.py [--sizes 10 50 200] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from fpdf import FPDF  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+from langchain_community.llms.fake import FakeStreamingListLLM  # noqa: E402
+from utils import resources  # noqa: E402
+from utils.embedding import LocalEmbedder  # noqa: E402
+from utils.embedding_cache import CachedEmbeddings, EmbeddingCache  # noqa: E402
+
+PAGES_PER_PDF = 10
+WORDS_PER_PAGE = 350
+QUERY_COUNT = 100
+# Share of queries that repeat an earlier one (exercises the answer cache)
+REPEAT_FRACTION = 0.2
+RSS_SAMPLE_INTERVAL = 0.05
+FAKE_ANSWER = "This is a synthetic answer produced by the benchmark LLM."
+
+VOCABULARY = [
+    f"{stem}{suffix}" for stem in (
+        "report", "budget", "revenue", "policy", "contract", "invoice", "audit", "sensor", "network", "protocol",
+        "design", "battery", "engine", "module", "patient", "dosage", "trial", "climate", "harbor", "ledger",
+        "quantum", "vector", "matrix", "kernel", "thread", "cache", "index", "segment", "cluster", "schema",
+    ) for suffix in ("", "s", "ing", "ed", "al", "ity")
+]
+
+
+class RssSampler:
+    """Peak resident set size of this process, sampled on a background thread."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current():
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def latency_summary(seconds):
+    return {
+        'count': len(seconds),
+        'p50_ms': round(percentile(seconds, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(seconds, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(seconds, 0.99) * 1000, 2),
+        'mean_ms': round(sum(seconds) / len(seconds) * 1000, 2),
+    }
+
+
+def make_image_page(path, rng):
+    """A page image with random shapes and no text layer (forces the OCR path)."""
+    image = Image.new('RGB', (850, 1100), 'white')
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = rng.randrange(0, 800), rng.randrange(0, 1050)
+        draw.rectangle([x, y, x + rng.randrange(10, 50), y + rng.randrange(10, 50)], outline='black')
+    image.save(path)
+
+
+def generate_corpus(directory, total_pages, image_fraction, seed):
+    """Write PDFs of PAGES_PER_PDF pages until total_pages pages exist; returns their paths."""
+    rng = random.Random(seed)
+    paths = []
+    image_path = os.path.join(directory, 'page_image.png')
+    make_image_page(image_path, rng)
+    written = 0
+    while written < total_pages:
+        pdf = FPDF()
+        pdf.set_font('Arial', size=10)
+        pages = min(PAGES_PER_PDF, total_pages - written)
+        for _ in range(pages):
+            pdf.add_page()
+            if rng.random() < image_fraction:
+                pdf.image(image_path, x=10, y=10, w=190)
+            else:
+                pdf.multi_cell(0, 5, " ".join(rng.choice(VOCABULARY) for _ in range(WORDS_PER_PAGE)))
+        path = os.path.join(directory, f"synthetic_{len(paths):04d}.pdf")
+        pdf.output(path)
+        paths.append(path)
+        written += pages
+    return paths
+
+
+def make_queries(count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if queries and rng.random() < REPEAT_FRACTION:
+            queries.append(rng.choice(queries))
+        else:
+            queries.append(f"What does the {rng.choice(VOCABULARY)} say about {rng.choice(VOCABULARY)}?")
+    return queries
+
+
+def install_fakes(embed_latency):
+    """Fresh pooled resources backed by the offline embedder and fake LLM (call from the corpus directory)."""
+    resources.invalidate()
+    embedding_cache = EmbeddingCache()
+    resources.register('embedder', CachedEmbeddings(LocalEmbedder(latency=embed_latency), cache=embedding_cache))
+    resources.register('llm', FakeStreamingListLLM(responses=[FAKE_ANSWER]))
+    return embedding_cache
+
+
+def run_size(total_pages, args):
+    from utils.answer_cache import get_answer_cache
+    from utils.pdf_handler import store_pdf
+    from utils.retrieval import get_answer_conversational, get_retriever
+
+    workdir = tempfile.mkdtemp(prefix=f"bench_{total_pages}_")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        embedding_cache = install_fakes(args.embed_latency)
+        pdf_paths = generate_corpus(workdir, total_pages, args.image_fraction, args.seed)
+
+        chunks = 0
+        start = time.perf_counter()
+        with RssSampler() as ingest_rss:
+            for pdf_path in pdf_paths:
+                _, _, counts = store_pdf(pdf_path)
+                chunks += counts.get('upsert', 0)
+        ingest_seconds = time.perf_counter() - start
+        ingest_cache = embedding_cache.stats()
+
+        queries = make_queries(args.queries, args.seed)
+        retrieval_seconds, answer_seconds = [], []
+        with RssSampler() as query_rss:
+            retriever = get_retriever()
+            for query in queries:
+                start = time.perf_counter()
+                retriever.invoke(query)
+                retrieval_seconds.append(time.perf_counter() - start)
+            for query in queries:
+                start = time.perf_counter()
+                get_answer_conversational(query, [])
+                answer_seconds.append(time.perf_counter() - start)
+
+        return {
+            'corpus_pages': total_pages,
+            'pdfs': len(pdf_paths),
+            'image_fraction': args.image_fraction,
+            'ingest': {
+                'seconds': round(ingest_seconds, 3),
+                'pages_per_sec': round(total_pages / ingest_seconds, 2),
+                'chunks': chunks,
+                'chunks_per_sec': round(chunks / ingest_seconds, 2),
+                'peak_rss_mb': round(ingest_rss.peak / 1024 / 1024, 1),
+                'embedding_cache': ingest_cache,
+            },
+            'query': {
+                'retrieval': latency_summary(retrieval_seconds),
+                'answer': latency_summary(answer_seconds),
+                'peak_rss_mb': round(query_rss.peak / 1024 / 1024, 1),
+                'embedding_cache': embedding_cache.stats(),
+                'answer_cache': get_answer_cache().stats(),
+            },
+        }
+    finally:
+        resources.invalidate()
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200], help="Corpus sizes in pages")
+    parser.add_argument('--queries', type=int, default=QUERY_COUNT)
+    parser.add_argument('--image-fraction', type=float, default=0.1, help="Share of image-only (OCR) pages")
+    parser.add_argument('--embed-latency', type=float, default=0.0, help="Simulated seconds per embedding request")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': vars(args),
+        'runs': [],
+    }
+    for total_pages in args.sizes:
+        run = run_size(total_pages, args)
+        results['runs'].append(run)
+        print(json.dumps(run))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
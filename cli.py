@@ -0,0 +1,160 @@
+# cli.py
+"""Headless command line for bulk ingestion and querying (no Streamlit needed).
+
+    python cli.py ingest data/inbox --workers 4 --tags finance,2024
+    python cli.py ask "What was the Q3 revenue?" --tags finance
+    python cli.py recommend "battery safety"
+    python cli.py similar "Annual Report"
+    python cli.py summarize
+    python cli.py batch requests.jsonl --concurrency 8 > results.jsonl
+    python cli.py qa questions.jsonl --rate 5 > answers.jsonl
+    python cli.py serve --port 8000
+"""
+import argparse
+import json
+import os
+import sys
+from utils.batch_qa import BATCH_LLM_CONCURRENCY, BATCH_LLM_RATE
+from utils.headless import BATCH_CONCURRENCY, answer_question, find_pdfs, ingest_file, ingest_paths, run_batch
+from utils.jobs import INGEST_WORKERS
+
+
+def print_json(result):
+    print(json.dumps(result, ensure_ascii=False), flush=True)
+
+
+def parse_tags(tags):
+    return [tag.strip() for tag in tags.split(',')] if tags else []
+
+
+def cmd_ingest(args):
+    paths = []
+    for target in args.paths:
+        paths.extend(find_pdfs(target, recursive=not args.no_recursive) if os.path.isdir(target) else [target])
+    if args.version_of:
+        # Only an explicit single file may replace a stored document
+        if len(paths) != 1:
+            print("--version-of needs exactly one PDF", file=sys.stderr)
+            return 2
+        result = ingest_file(paths[0], tags=parse_tags(args.tags), version_of=args.version_of)
+        print_json(result)
+        return 1 if result['status'] == 'failed' else 0
+    failed = 0
+    for result in ingest_paths(paths, tags=parse_tags(args.tags), workers=args.workers):
+        failed += result['status'] == 'failed'
+        print_json(result)
+    return 1 if failed else 0
+
+
+def cmd_ask(args):
+    filters = {}
+    if args.pdf_name:
+        filters['pdf_name'] = args.pdf_name
+    if args.tags:
+        filters['tags'] = parse_tags(args.tags)
+    print_json(answer_question(args.question, response_style=args.style, language=args.language, filters=filters))
+    return 0
+
+
+def cmd_recommend(args):
+    from utils.recommendations import get_recommendations
+    print_json({'query': args.query, 'pdf_names': get_recommendations(args.query, k=args.k)})
+    return 0
+
+
+def cmd_similar(args):
+    from utils.recommendations import get_similar_documents
+    print_json({'pdf_name': args.pdf_name, 'pdf_names': get_similar_documents([args.pdf_name], k=args.k)})
+    return 0
+
+
+def cmd_summarize(args):
+    from utils.summarization import summarize_documents
+    print_json({'summary': summarize_documents()})
+    return 0
+
+
+def cmd_batch(args):
+    lines = sys.stdin if args.file == '-' else open(args.file, 'r')
+    failed = 0
+    with lines:
+        for result in run_batch(lines, concurrency=args.concurrency):
+            failed += 'error' in result
+            print_json(result)
+    return 1 if failed else 0
+
+
+def cmd_qa(args):
+    from utils.batch_qa import answer_batch, read_questions
+    lines = sys.stdin if args.file == '-' else open(args.file, 'r')
+    with lines:
+        items = read_questions(lines)
+    failed = 0
+    for result in answer_batch(items, concurrency=args.concurrency, rate=args.rate):
+        failed += 'error' in result
+        print_json(result)
+    return 1 if failed else 0
+
+
+def cmd_serve(args):
+    import uvicorn
+    uvicorn.run('api:app', host=args.host, port=args.port, workers=1)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PDF chatbot without the Streamlit UI. Results are printed as JSON lines.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="Embed PDFs (files or directories)")
+    ingest.add_argument('paths', nargs='+')
+    ingest.add_argument('--tags', help="Comma-separated tags for every file")
+    ingest.add_argument('--workers', type=int, default=INGEST_WORKERS, help="PDFs ingested in parallel")
+    ingest.add_argument('--no-recursive', action='store_true', help="Only take PDFs directly inside directories")
+    ingest.add_argument('--version-of', help="doc_key of a stored document this single PDF replaces")
+    ingest.set_defaults(func=cmd_ingest)
+
+    ask = commands.add_parser('ask', help="Answer one question")
+    ask.add_argument('question')
+    ask.add_argument('--pdf-name', help="Restrict to PDFs whose name starts with this")
+    ask.add_argument('--tags', help="Restrict to PDFs with any of these comma-separated tags")
+    ask.add_argument('--style', default="Formal", choices=["Formal", "Informal", "Concise", "Detailed"])
+    ask.add_argument('--language', default="English")
+    ask.set_defaults(func=cmd_ask)
+
+    recommend = commands.add_parser('recommend', help="PDFs closest to a query")
+    recommend.add_argument('query')
+    recommend.add_argument('-k', type=int, default=5)
+    recommend.set_defaults(func=cmd_recommend)
+
+    similar = commands.add_parser('similar', help="PDFs most like a stored PDF")
+    similar.add_argument('pdf_name')
+    similar.add_argument('-k', type=int, default=5)
+    similar.set_defaults(func=cmd_similar)
+
+    summarize = commands.add_parser('summarize', help="Summary of all PDFs")
+    summarize.set_defaults(func=cmd_summarize)
+
+    batch = commands.add_parser('batch', help="Run JSONL requests ({\"op\": \"ask\", \"question\": ...} per line)")
+    batch.add_argument('file', help="JSONL file, or - for stdin")
+    batch.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY)
+    batch.set_defaults(func=cmd_batch)
+
+    qa = commands.add_parser('qa', help="Answer JSONL questions ({\"question\": ..., \"filters\": ...} per line) "
+                                       "with batched embedding and retrieval")
+    qa.add_argument('file', help="JSONL file, or - for stdin")
+    qa.add_argument('--concurrency', type=int, default=BATCH_LLM_CONCURRENCY, help="LLM calls in flight")
+    qa.add_argument('--rate', type=float, default=BATCH_LLM_RATE, help="Most LLM calls started per second")
+    qa.set_defaults(func=cmd_qa)
+
+    serve = commands.add_parser('serve', help="Run the HTTP API (api.py) with uvicorn")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000)
+    serve.set_defaults(func=cmd_serve)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# tests/conftest.py
+import hashlib
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCollection:
+    """In-memory stand-in for the part of the Chroma collection API the pipeline uses."""
+
+    def __init__(self):
+        self.records = {}
+
+    def add(self, ids, documents, metadatas, embeddings):
+        for chunk_id, document, metadata, embedding in zip(ids, documents, metadatas, embeddings):
+            if chunk_id in self.records:
+                raise ValueError(f"duplicate id {chunk_id}")
+            self.records[chunk_id] = {'document': document, 'metadata': dict(metadata), 'embedding': embedding}
+
+    def update(self, ids, metadatas):
+        for chunk_id, metadata in zip(ids, metadatas):
+            self.records[chunk_id]['metadata'] = dict(metadata)
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.records.pop(chunk_id, None)
+
+    def count(self):
+        return len(self.records)
+
+    @staticmethod
+    def _matches(metadata, where):
+        for key, condition in (where or {}).items():
+            if isinstance(condition, dict):
+                if metadata.get(key) not in condition['$in']:
+                    return False
+            elif metadata.get(key) != condition:
+                return False
+        return True
+
+    def get(self, ids=None, where=None, include=('documents', 'metadatas'), limit=None, offset=0):
+        matched = [
+            (chunk_id, record) for chunk_id, record in self.records.items()
+            if (ids is None or chunk_id in ids) and self._matches(record['metadata'], where)
+        ]
+        matched = matched[offset:offset + limit if limit is not None else None]
+        result = {'ids': [chunk_id for chunk_id, _ in matched]}
+        for field in ('documents', 'metadatas', 'embeddings'):
+            result[field] = [record[field[:-1]] for _, record in matched] if field in include else None
+        return result
+
+
+class RecordingListener:
+    """Ingestion listener that tracks the chunk ids it has been told about."""
+
+    def __init__(self):
+        self.ids = set()
+
+    def on_added(self, chunks):
+        for chunk in chunks:
+            assert chunk['id'] not in self.ids, f"{chunk['id']} added twice"
+            self.ids.add(chunk['id'])
+
+    def on_removed(self, chunks):
+        for chunk in chunks:
+            assert chunk['id'] in self.ids, f"{chunk['id']} removed but never added"
+            self.ids.remove(chunk['id'])
+
+    def on_updated(self, chunks):
+        pass
+
+
+def make_page_text(page_number, words=400):
+    return " ".join(f"page{page_number} word{index}" for index in range(words))
+
+
+@pytest.fixture
+def collection():
+    return FakeCollection()
+
+
+@pytest.fixture
+def fake_pages(monkeypatch):
+    """Serve page texts from a {pdf_path: [text, ...]} dict instead of extracting a real PDF."""
+    from utils import ingest_pipeline
+    from utils.extraction import PageText
+    documents = {}
+
+    def iter_pages(pdf_path, skip_fingerprints=()):
+        for number, text in enumerate(documents[pdf_path], start=1):
+            yield PageText(number, text, hashlib.md5(text.encode('utf-8')).hexdigest())
+
+    monkeypatch.setattr(ingest_pipeline, 'iter_pages', iter_pages)
+    return documents
@@ -0,0 +1,30 @@
+# tests/test_annotations.py
+import json
+from utils.annotations import AnnotationStore
+
+
+def test_empty_legacy_file_imports_nothing(tmp_path):
+    legacy = tmp_path / 'annotations.json'
+    legacy.write_text('  \n')
+    store = AnnotationStore(str(tmp_path / 'annotations.sqlite'), legacy_file=str(legacy))
+    assert store.all() == []
+    assert not legacy.exists()
+    assert (tmp_path / 'annotations.json.migrated').exists()
+
+
+def test_legacy_notes_are_imported(tmp_path):
+    legacy = tmp_path / 'annotations.json'
+    legacy.write_text(json.dumps({'a.pdf': ['first', 'second']}))
+    store = AnnotationStore(str(tmp_path / 'annotations.sqlite'), legacy_file=str(legacy))
+    assert store.all() == [('a.pdf', 'first'), ('a.pdf', 'second')]
+
+
+def test_unparseable_legacy_file_is_set_aside(tmp_path):
+    legacy = tmp_path / 'annotations.json'
+    legacy.write_text('{"a.pdf": [')
+    store = AnnotationStore(str(tmp_path / 'annotations.sqlite'), legacy_file=str(legacy))
+    assert store.all() == []
+    assert not legacy.exists()
+    assert (tmp_path / 'annotations.json.corrupt').read_text() == '{"a.pdf": ['
+    store.add('a.pdf', 'note', page=2)
+    assert store.count('a.pdf') == 1
@@ -0,0 +1,38 @@
+# tests/test_answer_audio_handler.py
+import os
+import tempfile
+import wave
+from utils.answer_audio_handler import SpeechPipeline, ToneBackend
+
+
+class FlakyBackend(ToneBackend):
+    """ToneBackend that fails on segments containing 'fail'."""
+
+    def synthesize(self, text, language, path):
+        if 'fail' in text:
+            raise RuntimeError('tts unavailable')
+        super().synthesize(text, language, path)
+
+
+def speak(pipeline, text):
+    for word in text.split(' '):
+        pipeline.feed(word + ' ')
+    return pipeline.close()
+
+
+def test_segments_are_joined_and_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    sentence = "This sentence is long enough to be synthesised as a segment of its own. "
+    out_path = speak(SpeechPipeline(backend=ToneBackend()), sentence * 3)
+    assert os.listdir(tmp_path) == [os.path.basename(out_path)]
+    with wave.open(out_path, 'rb') as audio:
+        assert audio.getnframes() > 0
+
+
+def test_failed_segments_are_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    pipeline = SpeechPipeline(backend=FlakyBackend())
+    out_path = speak(pipeline, "This first segment is certainly long enough to be synthesised on its own, so it works. "
+                               "This second segment will fail because the service is unavailable now.")
+    assert [str(error) for error in pipeline.errors] == ['tts unavailable']
+    assert os.listdir(tmp_path) == [os.path.basename(out_path)]
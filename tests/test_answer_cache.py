@@ -0,0 +1,21 @@
+# tests/test_answer_cache.py
+from utils.answer_cache import SemanticAnswerCache, make_scope
+
+
+def test_lookup_matches_similar_queries_within_scope():
+    cache = SemanticAnswerCache(threshold=0.9)
+    scope = make_scope(None, "Formal", "English")
+    cache.store([1.0, 0.0], scope, 'answer')
+    assert cache.lookup([0.99, 0.05], scope) == 'answer'
+    assert cache.lookup([0.0, 1.0], scope) is None
+    assert cache.lookup([1.0, 0.0], make_scope(None, "Concise", "English")) is None
+
+
+def test_version_change_drops_entries():
+    version = [1]
+    cache = SemanticAnswerCache(version=lambda: version[0])
+    scope = make_scope()
+    cache.store([1.0, 0.0], scope, 'answer')
+    assert cache.lookup([1.0, 0.0], scope) == 'answer'
+    version[0] = 2
+    assert cache.lookup([1.0, 0.0], scope) is None
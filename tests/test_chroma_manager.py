@@ -0,0 +1,14 @@
+# tests/test_chroma_manager.py
+from utils.chroma_manager import iter_collection
+
+
+def test_iter_collection_pages_through_every_chunk(collection):
+    collection.add(ids=[f"h1_1_{index}" for index in range(5)], documents=[f"text {index}" for index in range(5)],
+                   metadatas=[{'pdf_hash': 'h1', 'page': 1}] * 5, embeddings=[[float(index)] for index in range(5)])
+    pages = list(iter_collection(collection, ['documents', 'metadatas'], page_size=2))
+    assert [len(chunks) for chunks in pages] == [2, 2, 1]
+    assert pages[2] == [{'id': 'h1_1_4', 'document': 'text 4', 'metadata': {'pdf_hash': 'h1', 'page': 1}}]
+
+
+def test_iter_collection_of_an_empty_collection(collection):
+    assert list(iter_collection(collection, ['metadatas'])) == []
@@ -0,0 +1,19 @@
+# tests/test_document_index.py
+from utils.document_index import DocumentIndex
+
+
+def chunk(doc_key, embedding):
+    return {'id': f"{doc_key}_1_0", 'metadata': {'doc_key': doc_key, 'pdf_name': f"{doc_key}.pdf"},
+            'embedding': embedding}
+
+
+def test_changes_from_another_process_are_picked_up(tmp_path):
+    path = str(tmp_path / 'documents.sqlite')
+    app_index, api_index = DocumentIndex(path), DocumentIndex(path)
+    app_index.on_added([chunk('a', [1.0, 0.0])])
+    assert app_index.search([1.0, 0.0]) == [('a.pdf', 1.0)]
+    api_index.on_added([chunk('b', [0.0, 1.0])])
+    assert [name for name, _ in app_index.search([0.0, 1.0])] == ['b.pdf', 'a.pdf']
+    # A write from this process starts from the other process's state instead of overwriting it
+    app_index.on_added([chunk('c', [1.0, 1.0])])
+    assert len(DocumentIndex(path)) == 3
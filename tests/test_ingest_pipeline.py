@@ -0,0 +1,97 @@
+# tests/test_ingest_pipeline.py
+import functools
+import pytest
+from conftest import RecordingListener, make_page_text
+from utils import ingest_pipeline
+from utils.embedding import LocalEmbedder, add_in_batches
+from utils.ingest_pipeline import ingest_pdf, trim_partial_page
+from utils.metadata_index import MetadataIndex
+
+
+def chunk_metadata(pdf_hash, doc_key=None):
+    return {'doc_key': doc_key or pdf_hash, 'doc_name': 'report', 'pdf_hash': pdf_hash,
+            'pdf_name': f"report_{pdf_hash}.pdf", 'tags': 'None'}
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashAfter:
+    """Listener that lets `batches` batches through, then stops the run before the others hear of it."""
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def on_added(self, chunks):
+        if self.batches == 0:
+            raise Crash()
+        self.batches -= 1
+
+    def on_removed(self, chunks):
+        pass
+
+    def on_updated(self, chunks):
+        pass
+
+
+def test_resume_after_crash_between_write_and_listeners(tmp_path, collection, fake_pages, monkeypatch):
+    # Small Chroma batches that end part-way through a page
+    monkeypatch.setattr(ingest_pipeline, 'add_in_batches', functools.partial(add_in_batches, batch_size=4))
+    fake_pages['report.pdf'] = [make_page_text(page) for page in range(1, 7)]
+    recorder = RecordingListener()
+    metadata_index = MetadataIndex(str(tmp_path / 'metadata.sqlite'))
+    embedder = LocalEmbedder()
+
+    with pytest.raises(Crash):
+        ingest_pdf('report.pdf', collection, embedder, chunk_metadata('h3'), 'h3',
+                   listeners=[CrashAfter(1), recorder, metadata_index])
+    assert collection.count() > len(recorder.ids) > 0
+
+    listeners = [recorder, metadata_index]
+    trim_partial_page(collection, 'h3', listeners, indexed=metadata_index.known_chunks)
+    assert set(collection.records) == recorder.ids
+    ingest_pdf('report.pdf', collection, embedder, chunk_metadata('h3'), 'h3', listeners=listeners)
+
+    assert set(collection.records) == recorder.ids
+    assert metadata_index.known_chunks(collection.records) == set(collection.records)
+    assert {record['metadata']['page'] for record in collection.records.values()} == set(range(1, 7))
+
+
+def test_new_version_reuses_unchanged_pages_and_drops_removed_ones(collection, fake_pages):
+    pages = [make_page_text(page) for page in range(1, 5)]
+    fake_pages['v1.pdf'] = pages
+    fake_pages['v2.pdf'] = [pages[0], make_page_text(9), pages[2]]
+    recorder = RecordingListener()
+    embedder = LocalEmbedder()
+
+    ingest_pdf('v1.pdf', collection, embedder, chunk_metadata('h1', 'doc'), 'h1', listeners=[recorder])
+    first_version = dict(collection.records)
+    counts = ingest_pdf('v2.pdf', collection, embedder, chunk_metadata('h2', 'doc'), 'h2', listeners=[recorder])
+
+    kept = {chunk_id for chunk_id in first_version if chunk_id.startswith(('h1_1_', 'h1_3_'))}
+    removed = set(first_version) - kept
+    assert counts['reused'] == len(kept)
+    assert counts['removed'] == len(removed)
+    assert kept <= set(collection.records)
+    assert not removed & set(collection.records)
+    assert all(chunk_id.startswith('h2_2_') for chunk_id in set(collection.records) - kept)
+    assert set(collection.records) == recorder.ids
+    for chunk_id in kept:
+        # Reused chunks keep their embedding and point at the new version
+        assert collection.records[chunk_id]['embedding'] == first_version[chunk_id]['embedding']
+        assert collection.records[chunk_id]['metadata']['pdf_hash'] == 'h2'
+    assert {record['metadata']['page'] for record in collection.records.values()} == {1, 2, 3}
+
+
+def test_reingesting_the_same_pages_embeds_nothing(collection, fake_pages):
+    fake_pages['report.pdf'] = [make_page_text(page) for page in range(1, 4)]
+    embedder = LocalEmbedder()
+    ingest_pdf('report.pdf', collection, embedder, chunk_metadata('h1'), 'h1')
+    stored = set(collection.records)
+
+    counts = ingest_pdf('report.pdf', collection, embedder, chunk_metadata('h1'), 'h1')
+    assert counts['reused'] == len(stored)
+    assert counts['removed'] == 0
+    assert counts.get('embed', 0) == 0
+    assert set(collection.records) == stored
@@ -0,0 +1,81 @@
+# tests/test_jobs.py
+import time
+import pytest
+from utils import jobs
+from utils.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'jobs.sqlite')
+
+
+def expire_lease(queue, job_id):
+    queue._execute('UPDATE jobs SET heartbeat = ? WHERE id = ?', (time.time() - jobs.LEASE_TIMEOUT - 1, job_id))
+
+
+def test_jobs_are_claimed_once_in_order(path):
+    app, api = JobQueue(path), JobQueue(path)
+    first = app.submit('a.pdf', tags=['finance'])
+    second = app.submit('b.pdf')
+
+    claimed = api.claim()
+    assert claimed['id'] == first and claimed['owner'] == api.owner and claimed['tags'] == '["finance"]'
+    assert app.claim()['id'] == second
+    assert app.claim() is None and api.claim() is None
+    assert app.get_job(first)['status'] == RUNNING
+
+
+def test_expired_lease_is_requeued_for_resume(path):
+    crashed, survivor = JobQueue(path), JobQueue(path)
+    job_id = crashed.submit('a.pdf')
+    crashed.claim()
+
+    survivor.recover()
+    assert survivor.claim() is None  # the lease is still live
+    expire_lease(crashed, job_id)
+    claimed = survivor.claim()
+    assert claimed['id'] == job_id and claimed['resume'] == 1
+
+    # The old owner finishing late must not overwrite the new owner's outcome
+    crashed.finish(job_id, FAILED, error='stale')
+    assert survivor.get_job(job_id)['status'] == RUNNING
+    survivor.finish(job_id, DONE)
+    job = survivor.get_job(job_id)
+    assert job['status'] == DONE and job['progress'] == 1.0 and job['error'] is None
+
+
+def test_heartbeat_keeps_the_lease(path):
+    owner, other = JobQueue(path), JobQueue(path)
+    job_id = owner.submit('a.pdf')
+    owner.claim()
+    expire_lease(owner, job_id)
+    owner.heartbeat()
+    other.recover()
+    assert other.get_job(job_id)['status'] == RUNNING
+
+
+def test_cancel_queued_job_is_immediate(path):
+    queue = JobQueue(path)
+    job_id = queue.submit('a.pdf')
+    queue.cancel(job_id)
+    assert queue.get_job(job_id)['status'] == CANCELLED
+    assert queue.claim() is None
+
+    queue.retry(job_id)
+    assert queue.get_job(job_id)['status'] == QUEUED
+    assert queue.claim()['id'] == job_id
+
+
+def test_cancel_running_job_is_reported_through_progress(path):
+    worker, app = JobQueue(path), JobQueue(path)
+    job_id = worker.submit('a.pdf')
+    worker.claim()
+    assert worker.update_progress(job_id, 0.25, 'embedding') is False
+
+    app.cancel(job_id)
+    assert app.get_job(job_id)['status'] == RUNNING
+    assert worker.update_progress(job_id, 0.5) is True
+    worker.finish(job_id, CANCELLED)
+    assert app.get_job(job_id)['status'] == CANCELLED
+    assert not app.has_active_jobs()
@@ -0,0 +1,43 @@
+# tests/test_lexical_index.py
+from utils.lexical_index import LexicalIndex
+
+
+def test_changes_from_another_process_are_picked_up(tmp_path):
+    path = str(tmp_path / 'lexical.sqlite')
+    app_index, api_index = LexicalIndex(path), LexicalIndex(path)
+    api_index.add(['d1_1_0'], ['quarterly revenue grew'])
+    assert [chunk_id for chunk_id, _ in app_index.search('revenue')] == ['d1_1_0']
+    api_index.remove(['d1_1_0'])
+    assert app_index.search('revenue') == []
+
+
+def test_search_ranks_and_filters(tmp_path):
+    index = LexicalIndex(str(tmp_path / 'lexical.sqlite'))
+    index.add(['d1_1_0', 'd1_1_1', 'd1_2_0'], [
+        'invoice AB-12.3 was paid in march',
+        'the march report lists invoice totals and invoice dates',
+        'staff holiday schedule',
+    ])
+    assert [chunk_id for chunk_id, _ in index.search('invoice')] == ['d1_1_1', 'd1_1_0']
+    assert [chunk_id for chunk_id, _ in index.search('ab-12.3')] == ['d1_1_0']
+    assert [chunk_id for chunk_id, _ in index.search('invoice', allowed_ids={'d1_1_0'})] == ['d1_1_0']
+    assert len(index.search('invoice march holiday', k=1)) == 1
+    assert index.search('payroll') == []
+
+
+def test_remove_and_reindex(tmp_path):
+    path = str(tmp_path / 'lexical.sqlite')
+    index = LexicalIndex(path)
+    index.add(['d1_1_0', 'd1_1_1'], ['quarterly revenue grew', 'revenue targets'])
+    index.remove(['d1_1_0', 'unknown'])
+    assert [chunk_id for chunk_id, _ in index.search('revenue')] == ['d1_1_1']
+    assert index.search('quarterly') == []
+
+    # Adding an existing id replaces its text instead of duplicating it
+    index.add(['d1_1_1'], ['headcount plan'])
+    assert index.search('revenue') == []
+    assert len(index) == 1
+
+    reopened = LexicalIndex(path)
+    assert len(reopened) == 1
+    assert [chunk_id for chunk_id, _ in reopened.search('headcount')] == ['d1_1_1']
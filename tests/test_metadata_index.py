@@ -0,0 +1,15 @@
+# tests/test_metadata_index.py
+from utils.metadata_index import MetadataIndex
+
+
+def chunks(doc_key, pdf_name, count, tags='None'):
+    return [{'id': f"{doc_key}_1_{index}", 'metadata': {'doc_key': doc_key, 'pdf_name': pdf_name, 'tags': tags}}
+            for index in range(count)]
+
+
+def test_chunk_counts_per_document(tmp_path):
+    index = MetadataIndex(str(tmp_path / 'metadata.sqlite'))
+    index.on_added(chunks('h1', 'a_h1.pdf', 3) + chunks('h2', 'b_h2.pdf', 2))
+    assert index.chunk_counts() == [('a_h1.pdf', 3), ('b_h2.pdf', 2)]
+    index.on_removed(chunks('h2', 'b_h2.pdf', 2))
+    assert index.chunk_counts() == [('a_h1.pdf', 3)]
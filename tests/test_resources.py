@@ -0,0 +1,33 @@
+# tests/test_resources.py
+from utils import resources
+
+
+class Closeable:
+    def __init__(self, name, released):
+        self.name = name
+        self.released = released
+
+    def close(self):
+        self.released.append(self.name)
+
+
+def test_invalidate_releases_matching_resources_newest_first():
+    released = []
+    resources.register('test.first', Closeable('first', released))
+    resources.register('test.second', Closeable('second', released))
+    resources.register('other.third', Closeable('third', released))
+    resources.invalidate('test.')
+    assert released == ['second', 'first']
+    resources.invalidate('other.')
+    assert released == ['second', 'first', 'third']
+
+
+def test_invalidating_jobs_stops_the_worker_pool(tmp_path, monkeypatch):
+    from utils.jobs import start_ingest_workers
+    monkeypatch.chdir(tmp_path)
+    workers = start_ingest_workers(workers=1)
+    resources.invalidate('jobs.')
+    assert not any(thread.is_alive() for thread in workers._threads)
+    restarted = start_ingest_workers(workers=1)
+    assert restarted is not workers
+    resources.invalidate('jobs.')
@@ -0,0 +1,100 @@
+# tests/test_security.py
+import os
+import pytest
+from cryptography.exceptions import InvalidTag
+from utils import security
+from utils.resources import invalidate
+from utils.security import HEADER, TAG_SIZE, EncryptedReader, decrypt_pdf, encrypt_pdf, open_pdf, read_range
+
+SEGMENT_SIZE = 1024
+
+
+@pytest.fixture(autouse=True)
+def secret_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(security, 'KEY_FILE', str(tmp_path / 'secret.key'))
+    security.generate_key()
+    yield
+    invalidate('security.')
+
+
+@pytest.fixture
+def plaintext():
+    return os.urandom(SEGMENT_SIZE * 3 + 100)
+
+
+@pytest.fixture
+def encrypted_path(tmp_path, plaintext):
+    path = tmp_path / 'report.pdf'
+    path.write_bytes(plaintext)
+    encrypt_pdf(str(path), segment_size=SEGMENT_SIZE)
+    return str(path)
+
+
+def test_round_trip(encrypted_path, plaintext):
+    assert security.is_encrypted(encrypted_path)
+    assert decrypt_pdf(encrypted_path) == plaintext
+    with open_pdf(encrypted_path) as reader:
+        assert reader.read() == plaintext
+
+
+def test_empty_file_round_trip(tmp_path):
+    path = tmp_path / 'empty.pdf'
+    path.write_bytes(b'')
+    encrypt_pdf(str(path), segment_size=SEGMENT_SIZE)
+    assert decrypt_pdf(str(path)) == b''
+
+
+def test_ranges_across_segment_boundaries(encrypted_path, plaintext):
+    for start, length in [(0, 10), (SEGMENT_SIZE - 5, 10), (SEGMENT_SIZE * 2, SEGMENT_SIZE + 50),
+                          (len(plaintext) - 3, 100), (len(plaintext) + 10, 5)]:
+        assert read_range(encrypted_path, start, length) == plaintext[start:start + length]
+    with EncryptedReader(encrypted_path) as reader:
+        reader.seek(-20, os.SEEK_END)
+        assert reader.read() == plaintext[-20:]
+
+
+def test_flipped_byte_is_detected(encrypted_path):
+    with open(encrypted_path, 'r+b') as f:
+        f.seek(HEADER.size + SEGMENT_SIZE + TAG_SIZE + 7)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 1]))
+    # The first segment is untouched; the second no longer authenticates
+    assert len(read_range(encrypted_path, 0, SEGMENT_SIZE)) == SEGMENT_SIZE
+    with pytest.raises(InvalidTag):
+        read_range(encrypted_path, SEGMENT_SIZE, 10)
+
+
+def test_swapped_segments_are_detected(encrypted_path):
+    with open(encrypted_path, 'rb') as f:
+        data = f.read()
+    stride = SEGMENT_SIZE + TAG_SIZE
+    first, second = data[HEADER.size:HEADER.size + stride], data[HEADER.size + stride:HEADER.size + 2 * stride]
+    with open(encrypted_path, 'wb') as f:
+        f.write(data[:HEADER.size] + second + first + data[HEADER.size + 2 * stride:])
+    with pytest.raises(InvalidTag):
+        read_range(encrypted_path, 0, 10)
+
+
+def test_edited_header_is_detected(encrypted_path, plaintext):
+    with open(encrypted_path, 'r+b') as f:
+        magic, segment_size, prefix, length = HEADER.unpack(f.read(HEADER.size))
+        f.seek(0)
+        f.write(HEADER.pack(magic, segment_size, prefix, length - 100))
+    with pytest.raises(InvalidTag):
+        decrypt_pdf(encrypted_path)
+
+
+def test_other_key_cannot_decrypt(encrypted_path):
+    security.generate_key()
+    with pytest.raises(InvalidTag):
+        decrypt_pdf(encrypted_path)
+
+
+def test_plain_file_is_rejected(tmp_path):
+    path = tmp_path / 'plain.pdf'
+    path.write_bytes(b'%PDF-1.7 not encrypted')
+    with pytest.raises(ValueError):
+        EncryptedReader(str(path))
+    with open_pdf(str(path)) as f:
+        assert f.read() == b'%PDF-1.7 not encrypted'
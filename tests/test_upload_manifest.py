@@ -0,0 +1,46 @@
+# tests/test_upload_manifest.py
+import time
+from utils.upload_manifest import UploadManifest
+
+
+def test_claim_is_exclusive_until_released(tmp_path):
+    manifest = UploadManifest(str(tmp_path / 'uploads.sqlite'))
+    assert manifest.claim_ingest('h1', 'a') == 'claimed'
+    assert manifest.claim_ingest('h1', 'b') == 'busy'
+    manifest.release_claim('h1', 'b')
+    assert manifest.claim_ingest('h1', 'b') == 'busy'
+    manifest.release_claim('h1', 'a')
+    assert manifest.claim_ingest('h1', 'b') == 'claimed'
+
+
+def test_claim_is_shared_across_connections(tmp_path):
+    first = UploadManifest(str(tmp_path / 'uploads.sqlite'))
+    second = UploadManifest(str(tmp_path / 'uploads.sqlite'))
+    assert first.claim_ingest('h1', 'a') == 'claimed'
+    assert second.claim_ingest('h1', 'b') == 'busy'
+
+
+def test_stale_claim_is_taken_over(tmp_path):
+    manifest = UploadManifest(str(tmp_path / 'uploads.sqlite'))
+    manifest.claim_ingest('h1', 'a')
+    manifest._conn.execute('UPDATE ingesting SET heartbeat = ?', (time.time() - 3600,))
+    manifest._conn.commit()
+    assert manifest.claim_ingest('h1', 'b') == 'claimed'
+    manifest.refresh_claim('h1', 'a')
+    assert manifest.claim_ingest('h1', 'a') == 'busy'
+
+
+def test_ingested_content_is_not_claimed(tmp_path):
+    manifest = UploadManifest(str(tmp_path / 'uploads.sqlite'))
+    manifest.mark_ingested('h1', 'a_h1.pdf')
+    assert manifest.claim_ingest('h1', 'a') == 'ingested'
+
+
+def test_superseded_content_can_be_uploaded_again(tmp_path):
+    manifest = UploadManifest(str(tmp_path / 'uploads.sqlite'))
+    manifest.record('upload-1', 'h1', 'report.pdf', stored_path='data/pdfs/report_h1.pdf', job_id=1)
+    manifest.mark_ingested('h1', 'report_h1.pdf')
+    manifest.supersede(['h1'])
+    assert not manifest.is_ingested('h1')
+    assert manifest.by_hash('h1') is None
+    assert manifest.by_upload_id('upload-1') is not None
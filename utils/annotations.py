@@ -1,21 +1,127 @@
 # utils/annotations.py
 import json
 import os
+import threading
+import time
+from utils.resources import get_resource
+from utils.storage import open_store
 
+ANNOTATIONS_DB = 'data/annotations.sqlite'
+# Legacy store, imported once into ANNOTATIONS_DB and then renamed
 ANNOTATIONS_FILE = 'data/annotations.json'
+ANNOTATIONS_PAGE_SIZE = 20
+
+
+class AnnotationStore:
+    """Annotations in SQLite, indexed by PDF and page.
+
+    Each save is a single-row insert in its own transaction, so concurrent
+    Streamlit sessions (and processes, via SQLite's file locking) never
+    overwrite each other's notes.
+    """
+
+    def __init__(self, path=ANNOTATIONS_DB, legacy_file=ANNOTATIONS_FILE):
+        self._lock = threading.Lock()
+        self._conn = open_store(path, timeout=30)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS annotations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pdf_name TEXT NOT NULL,
+                page INTEGER,
+                note TEXT NOT NULL,
+                created REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_annotations_pdf ON annotations (pdf_name, page, id);
+        ''')
+        self._conn.commit()
+        self._migrate(legacy_file)
+
+    def _migrate(self, legacy_file):
+        """One-time import of the old JSON file ({pdf_name: [note, ...]}).
+
+        An empty file imports nothing; one that is not valid JSON is renamed to
+        `<file>.corrupt` and skipped.
+        """
+        if not legacy_file or not os.path.exists(legacy_file):
+            return
+        with self._lock:
+            # The write lock makes a second process wait, then find the file gone
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                if os.path.exists(legacy_file):
+                    with open(legacy_file, 'r') as f:
+                        text = f.read()
+                    try:
+                        # The repo ships the file empty
+                        legacy = json.loads(text) if text.strip() else {}
+                    except ValueError:
+                        # Keep an unreadable file for inspection rather than fail to start
+                        os.replace(legacy_file, f"{legacy_file}.corrupt")
+                        self._conn.commit()
+                        return
+                    now = time.time()
+                    self._conn.executemany(
+                        'INSERT INTO annotations (pdf_name, note, created) VALUES (?, ?, ?)',
+                        [(pdf_name, note, now) for pdf_name, notes in legacy.items() for note in notes]
+                    )
+                    os.replace(legacy_file, f"{legacy_file}.migrated")
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def add(self, pdf_name, note, page=None):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT INTO annotations (pdf_name, page, note, created) VALUES (?, ?, ?, ?)',
+                (pdf_name, page, note, time.time())
+            )
+        return cursor.lastrowid
+
+    def list(self, pdf_name, page=None, limit=ANNOTATIONS_PAGE_SIZE, offset=0):
+        """Annotations of one PDF (optionally one page) as dicts, oldest first."""
+        sql = 'SELECT id, pdf_name, page, note, created FROM annotations WHERE pdf_name = ?'
+        params = [pdf_name]
+        if page is not None:
+            sql += ' AND page = ?'
+            params.append(page)
+        sql += ' ORDER BY id LIMIT ? OFFSET ?'
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit, offset]).fetchall()
+        return [dict(zip(('id', 'pdf_name', 'page', 'note', 'created'), row)) for row in rows]
+
+    def count(self, pdf_name, page=None):
+        sql = 'SELECT COUNT(*) FROM annotations WHERE pdf_name = ?'
+        params = [pdf_name]
+        if page is not None:
+            sql += ' AND page = ?'
+            params.append(page)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def all(self):
+        with self._lock:
+            return self._conn.execute('SELECT pdf_name, note FROM annotations ORDER BY id').fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def delete(self, annotation_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM annotations WHERE id = ?', (annotation_id,))
+
+
+def get_annotation_store():
+    return get_resource('annotations', AnnotationStore)
+
 
 def load_annotations():
-    if os.path.exists(ANNOTATIONS_FILE):
-        with open(ANNOTATIONS_FILE, 'r') as f:
-            return json.load(f)
-    else:
-        return {}
-
-def save_annotation(pdf_name, annotation):
-    annotations = load_annotations()
-    if pdf_name in annotations:
-        annotations[pdf_name].append(annotation)
-    else:
-        annotations[pdf_name] = [annotation]
-    with open(ANNOTATIONS_FILE, 'w') as f:
-        json.dump(annotations, f)
+    """All annotations as {pdf_name: [note, ...]}; prefer AnnotationStore.list for paged reads."""
+    annotations = {}
+    for pdf_name, note in get_annotation_store().all():
+        annotations.setdefault(pdf_name, []).append(note)
+    return annotations
+
+
+def save_annotation(pdf_name, annotation, page=None):
+    return get_annotation_store().add(pdf_name, annotation, page=page)
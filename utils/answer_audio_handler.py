@@ -1,22 +1,148 @@
 # Ensure that tempfile is imported
+import math
+import os
+import queue
+import re
+import struct
 import tempfile
+import threading
+import wave
 from gtts import gTTS
 import streamlit as st
+from utils.metrics import get_metrics, span
+
+# gTTS language codes for the languages offered in the sidebar
+LANGUAGE_CODES = {'English': 'en', 'Spanish': 'es', 'French': 'fr', 'German': 'de'}
+# Sentences are merged until a segment has at least this many characters
+MIN_SEGMENT_CHARS = 80
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def language_code(language):
+    return LANGUAGE_CODES.get(language, language[:2].lower())
+
+
+class GTTSBackend:
+    """Google Text-to-Speech; segments are MP3 files that can be joined by concatenation."""
+    suffix = '.mp3'
+    mime_type = 'audio/mp3'
+
+    def synthesize(self, text, language, path):
+        gTTS(text, lang=language_code(language)).save(path)
+
+    def join(self, paths, out_path):
+        with open(out_path, 'wb') as out:
+            for path in paths:
+                with open(path, 'rb') as segment:
+                    out.write(segment.read())
+
+
+class ToneBackend:
+    """Offline stand-in synthesiser: one short beep per word, written as WAV."""
+    suffix = '.wav'
+    mime_type = 'audio/wav'
+    sample_rate = 8000
+
+    def synthesize(self, text, language, path):
+        beep = [int(8000 * math.sin(2 * math.pi * 440 * i / self.sample_rate)) for i in range(800)]
+        silence = [0] * 400
+        samples = (beep + silence) * max(1, len(text.split()))
+        with wave.open(path, 'wb') as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(self.sample_rate)
+            out.writeframes(struct.pack(f'<{len(samples)}h', *samples))
+
+    def join(self, paths, out_path):
+        with wave.open(out_path, 'wb') as out:
+            for index, path in enumerate(paths):
+                with wave.open(path, 'rb') as segment:
+                    if index == 0:
+                        out.setparams(segment.getparams())
+                    out.writeframes(segment.readframes(segment.getnframes()))
+
+
+class SpeechPipeline:
+    """Synthesises speech in a background thread while the answer text is still arriving.
+
+    feed() accepts streamed text; each complete sentence-sized segment is
+    handed to the TTS worker right away. close() flushes the remainder,
+    waits for the worker and returns the path of the joined audio file; the
+    segment files are deleted once joined. Segments that failed to
+    synthesise are left out of the audio and their exceptions kept in
+    `errors` for the caller to report.
+    """
+
+    def __init__(self, language='English', backend=None):
+        self.language = language
+        self.backend = backend or GTTSBackend()
+        self.segments = []
+        self.errors = []
+        self._buffer = ''
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            text = self._queue.get()
+            if text is None:
+                return
+            path = tempfile.NamedTemporaryFile(delete=False, suffix=self.backend.suffix).name
+            try:
+                with span('tts', chars=len(text)):
+                    self.backend.synthesize(text, self.language, path)
+                self.segments.append(path)
+            except Exception as e:
+                os.remove(path)
+                get_metrics().increment('tts_errors')
+                self.errors.append(e)
+
+    def feed(self, text):
+        self._buffer += text
+        parts = SENTENCE_END.split(self._buffer)
+        # The last part may be an unfinished sentence
+        complete, self._buffer = parts[:-1], parts[-1]
+        segment = ''
+        for sentence in complete:
+            segment = f"{segment} {sentence}".strip()
+            if len(segment) >= MIN_SEGMENT_CHARS:
+                self._queue.put(segment)
+                segment = ''
+        if segment:
+            self._buffer = f"{segment} {self._buffer}"
+
+    def close(self):
+        if self._buffer.strip():
+            self._queue.put(self._buffer.strip())
+        self._buffer = ''
+        self._queue.put(None)
+        self._worker.join()
+        if not self.segments:
+            return None
+        try:
+            out_path = tempfile.NamedTemporaryFile(delete=False, suffix=self.backend.suffix).name
+            self.backend.join(self.segments, out_path)
+            return out_path
+        finally:
+            for path in self.segments:
+                os.remove(path)
+            self.segments = []
+
 
 def generate_audio(answer, language='en'):
     try:
         # Use gTTS to generate the MP3 file
-        tts = gTTS(answer, lang=language[:2].lower())
-        
-        # Create a temporary MP3 file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        tts.save('answer_final.mp3')  # Save the TTS output to the file
-        
+        with span('tts', chars=len(answer)):
+            tts = gTTS(answer, lang=language_code(language))
+
+            tts.save('answer_final.mp3')  # Save the TTS output to the file
+
         # Store the file path in session state
         st.session_state.generated_audio_file = 'answer_final.mp3'
         st.success("Audio generated successfully.")
 
         return 'answer_final.mp3'
-        
+
     except Exception as e:
         st.error(f"Error generating audio: {e}")
@@ -0,0 +1,99 @@
+# utils/answer_cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from utils.resources import get_resource
+
+# Minimum cosine similarity between query embeddings to reuse an answer
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_TTL = 60 * 60
+ANSWER_CACHE_MAX_ENTRIES = 1000
+
+
+def make_scope(filters=None, response_style=None, language=None):
+    """Cache scope: answers are only shared between identical filter/style/language settings."""
+    return json.dumps([filters, response_style, language], sort_keys=True)
+
+
+class SemanticAnswerCache:
+    """In-memory answer cache matched by query-embedding similarity.
+
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted beyond `max_entries`. invalidate() drops everything, e.g. after
+    the collection changes. `version`, if given, is called on every lookup;
+    when its value changes (documents ingested by another process) the cache
+    is dropped as well.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES, version=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # entry id -> (scope, unit vector, value, created)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._version_source = version
+        self._version = version() if version else None
+
+    @staticmethod
+    def _normalise(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_embedding, scope):
+        """Return the cached value for the most similar query in `scope`, or None."""
+        query = self._normalise(query_embedding)
+        now = time.time()
+        version = self._version_source() if self._version_source else None
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            expired = [key for key, entry in self._entries.items() if now - entry[3] > self.ttl]
+            for key in expired:
+                del self._entries[key]
+            candidates = [(key, entry) for key, entry in self._entries.items() if entry[0] == scope]
+            if candidates:
+                similarities = np.stack([entry[1] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding, scope, value):
+        with self._lock:
+            self._entries[self._next_id] = (scope, self._normalise(query_embedding), value, time.time())
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._entries)
+        }
+
+
+def get_answer_cache():
+    def create():
+        # The metadata index is written on every ingest, by whichever process runs it
+        from utils.metadata_index import get_metadata_index
+        return SemanticAnswerCache(version=get_metadata_index().data_version)
+    return get_resource('answer_cache', create)
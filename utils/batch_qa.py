@@ -0,0 +1,136 @@
+# utils/batch_qa.py
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.answer_cache import get_answer_cache, make_scope
+from utils.conversation_store import source_refs
+from utils.metrics import get_metrics, span
+from utils.prompting import build_context, build_prompt
+from utils.resources import get_embedder, get_llm
+from utils.retrieval import get_retriever
+
+# LLM calls in flight at once, and the most started per second
+BATCH_LLM_CONCURRENCY = 8
+BATCH_LLM_RATE = 5.0
+
+
+class RateLimiter:
+    """Spaces acquire() calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval
+        if wait:
+            time.sleep(wait)
+
+
+def read_questions(lines):
+    """Batch items from JSONL lines ({"question": ..., "filters": {...}, ...}); blank lines are skipped."""
+    items = []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {line_number}: {e}")
+        if not isinstance(item, dict) or not item.get('question'):
+            raise ValueError(f"Line {line_number}: expected an object with a question")
+        items.append(dict({'id': line_number}, **item))
+    return items
+
+
+def answer_batch(items, concurrency=BATCH_LLM_CONCURRENCY, rate=BATCH_LLM_RATE):
+    """Answer many questions, yielding one result dict per question as soon as it is ready.
+
+    items: dicts with 'question' and optionally 'id', 'filters', 'response_style'
+    and 'language'. All questions are embedded in one call; questions sharing
+    filters are retrieved with one vector search; questions that end up with
+    the same prompt (same question, style, language and retrieved context)
+    share one LLM call, and repeated chunk texts appear in a context only once.
+    Timings are per question; embedding and retrieval are shared costs, split
+    evenly across the questions involved.
+    """
+    items = [dict(item, index=index) for index, item in enumerate(items)]
+    if not items:
+        return
+    answer_cache = get_answer_cache()
+    llm = get_llm()
+
+    start = time.perf_counter()
+    with span('embed_query', queries=len(items)):
+        embeddings = get_embedder().embed_queries([item['question'] for item in items])
+    embed_share = (time.perf_counter() - start) / len(items)
+
+    def result(item, answer, source_documents, **extra):
+        return dict({
+            'id': item.get('id', item['index']),
+            'index': item['index'],
+            'question': item['question'],
+            'answer': answer,
+            'sources': source_refs(source_documents),
+        }, **extra)
+
+    # Serve repeated questions from the answer cache; group the rest by filters
+    groups = {}
+    for item, embedding in zip(items, embeddings):
+        item['embedding'] = embedding
+        item['scope'] = make_scope(item.get('filters'), item.get('response_style', "Formal"),
+                                   item.get('language', "English"))
+        cached = answer_cache.lookup(embedding, item['scope'])
+        if cached is not None:
+            get_metrics().increment('answer_cache_hits')
+            yield result(item, cached[0], cached[1], cached=True,
+                         timings={'embed': embed_share, 'total': time.perf_counter() - start})
+            continue
+        groups.setdefault(json.dumps(item.get('filters') or None, sort_keys=True), []).append(item)
+
+    # One dense search per filter group, then one prompt per distinct question + context
+    prompts = {}
+    for filters, group in groups.items():
+        group_start = time.perf_counter()
+        with span('retrieve', queries=len(group)):
+            retrieved = get_retriever(json.loads(filters)).retrieve_batch(
+                [item['question'] for item in group], [item['embedding'] for item in group]
+            )
+        retrieve_share = (time.perf_counter() - group_start) / len(group)
+        for item, source_documents in zip(group, retrieved):
+            context, item['source_documents'] = build_context(source_documents)
+            item['timings'] = {'embed': embed_share, 'retrieve': retrieve_share}
+            prompt = build_prompt(item['question'], context, response_style=item.get('response_style', "Formal"),
+                                  language=item.get('language', "English"))
+            prompts.setdefault(prompt, []).append(item)
+
+    get_metrics().increment('batch_llm_calls_saved', sum(len(sharing) - 1 for sharing in prompts.values()))
+    limiter = RateLimiter(rate)
+
+    def ask(prompt):
+        limiter.acquire()
+        llm_start = time.perf_counter()
+        with span('llm'):
+            answer = llm.invoke(prompt).strip()
+        return answer, time.perf_counter() - llm_start
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(ask, prompt): prompt for prompt in prompts}
+        for future in as_completed(futures):
+            sharing = prompts[futures[future]]
+            try:
+                answer, llm_seconds = future.result()
+            except Exception as e:
+                for item in sharing:
+                    yield dict(result(item, None, item['source_documents']), error=str(e))
+                continue
+            for item in sharing:
+                answer_cache.store(item['embedding'], item['scope'], (answer, item['source_documents']))
+                timings = dict(item['timings'], llm=llm_seconds, total=time.perf_counter() - start)
+                yield result(item, answer, item['source_documents'], deduplicated=len(sharing) > 1,
+                             timings=timings)
@@ -2,6 +2,9 @@
 import os
 import chromadb
 from chromadb.config import Settings
+from utils.resources import get_resource
+
+COLLECTION_NAME = 'pdf_embeddings'
 
 # def get_chroma_client():
 #     persist_directory = 'data/chroma'
@@ -12,7 +15,7 @@ from chromadb.config import Settings
 #         persist_directory=persist_directory
 #     ))
 
-def get_chroma_client():
+def create_chroma_client():
     persist_directory = 'data/chroma'
     if not os.path.exists(persist_directory):
         os.makedirs(persist_directory)
@@ -26,13 +29,58 @@ def get_chroma_client():
     
     return client
 
-    return client
+def get_chroma_client():
+    """Shared PersistentClient, created once per process."""
+    return get_resource('chroma.client', create_chroma_client)
+
+def get_collection(name=COLLECTION_NAME):
+    return get_resource(f'chroma.collection.{name}', lambda: get_chroma_client().get_or_create_collection(name))
 
 def persist_db(client):
     client.persist()
 
 def get_all_documents():
-    client = get_chroma_client()
-    collection = client.get_or_create_collection('pdf_embeddings')
+    collection = get_collection()
     results = collection.get()
     return results
+
+def iter_collection(collection, include, page_size=1000):
+    """Every chunk of a collection, one page (list of chunk dicts) at a time.
+
+    Chunk dicts carry the id plus the included fields under their listener
+    names ('document', 'metadata', 'embedding'), so they can be passed
+    straight to an ingestion listener.
+    """
+    offset = 0
+    while True:
+        page = collection.get(include=include, limit=page_size, offset=offset)
+        chunks = [{'id': chunk_id} for chunk_id in page['ids']]
+        for field in include:
+            for chunk, value in zip(chunks, page[field]):
+                chunk[field[:-1]] = value
+        if chunks:
+            yield chunks
+        if len(chunks) < page_size:
+            return
+        offset += page_size
+
+def browse_documents(limit=50, offset=0, pdf_name=None, tags=None, include_documents=False):
+    """One page of stored chunks: metadata only unless include_documents is set.
+
+    pdf_name (a name prefix) / tags restrict the page server side via the
+    documents known to the metadata index.
+    """
+    from utils.metadata_index import resolve_filters
+    where = None
+    doc_keys = resolve_filters({'pdf_name': pdf_name, 'tags': tags})
+    if doc_keys is not None:
+        if not doc_keys:
+            return {'ids': [], 'metadatas': [], 'documents': []}
+        where = {'doc_key': {'$in': doc_keys}}
+    include = ['metadatas', 'documents'] if include_documents else ['metadatas']
+    return get_collection().get(where=where, limit=limit, offset=offset, include=include)
+
+def count_chunks_by_pdf():
+    """Number of chunks per pdf_name, from the metadata index (one grouped query, no collection scan)."""
+    from utils.metadata_index import get_metadata_index
+    return dict(get_metadata_index().chunk_counts())
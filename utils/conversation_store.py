@@ -0,0 +1,133 @@
+# utils/conversation_store.py
+import json
+import threading
+import time
+from utils.resources import get_resource
+from utils.storage import open_store
+
+CONVERSATIONS_DB = 'data/conversations.sqlite'
+HISTORY_PAGE_SIZE = 10
+# Most recent turns handed to the answer pipeline as chat history
+HISTORY_TURNS = 20
+# Turns read per query while writing a report
+REPORT_BATCH_SIZE = 100
+REPORT_FILE = 'chatbot_report.pdf'
+
+
+def source_refs(source_documents):
+    """Compact references to the source chunks: chunk id, PDF name and page."""
+    return [
+        {'id': doc.id, 'pdf_name': doc.metadata.get('pdf_name', 'Unknown PDF'), 'page': doc.metadata.get('page')}
+        for doc in source_documents
+    ]
+
+
+class ConversationStore:
+    """Question/answer turns per session in SQLite, with sources kept as references.
+
+    Turns survive reruns and restarts, and every read is bounded (a page of
+    history, the last few turns, or a batch of the report), so a long
+    session costs the same per rerun as a short one.
+    """
+
+    def __init__(self, path=CONVERSATIONS_DB):
+        self._lock = threading.Lock()
+        self._conn = open_store(path, timeout=30)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_turns_session ON turns (session_id, id);
+        ''')
+        self._conn.commit()
+
+    @staticmethod
+    def _turn(row):
+        turn_id, question, answer, sources, created = row
+        return {'id': turn_id, 'question': question, 'answer': answer, 'sources': json.loads(sources),
+                'created': created}
+
+    def add(self, session_id, question, answer, source_documents):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT INTO turns (session_id, question, answer, sources, created) VALUES (?, ?, ?, ?, ?)',
+                (session_id, question, answer, json.dumps(source_refs(source_documents)), time.time())
+            )
+        return cursor.lastrowid
+
+    def count(self, session_id):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM turns WHERE session_id = ?', (session_id,)).fetchone()[0]
+
+    def list(self, session_id, limit=HISTORY_PAGE_SIZE, offset=0):
+        """Turns of a session as dicts, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, question, answer, sources, created FROM turns WHERE session_id = ? '
+                'ORDER BY id DESC LIMIT ? OFFSET ?', (session_id, limit, offset)
+            ).fetchall()
+        return [self._turn(row) for row in rows]
+
+    def latest(self, session_id):
+        turns = self.list(session_id, limit=1)
+        return turns[0] if turns else None
+
+    def chat_history(self, session_id, turns=HISTORY_TURNS):
+        """The last `turns` (question, answer) pairs, oldest first."""
+        return [(turn['question'], turn['answer']) for turn in reversed(self.list(session_id, limit=turns))]
+
+    def iter_turns(self, session_id, batch_size=REPORT_BATCH_SIZE):
+        """Every turn of a session, oldest first, read batch_size rows at a time."""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT id, question, answer, sources, created FROM turns WHERE session_id = ? AND id > ? '
+                    'ORDER BY id LIMIT ?', (session_id, last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._turn(row)
+            last_id = rows[-1][0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def clear(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM turns WHERE session_id = ?', (session_id,))
+
+
+def get_conversation_store():
+    return get_resource('conversations', ConversationStore)
+
+
+def _latin1(text):
+    # The core PDF fonts only cover Latin-1
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def write_report(session_id, path=REPORT_FILE):
+    """Write a session's questions and answers to a PDF, one turn at a time."""
+    from fpdf import FPDF
+
+    class PDF(FPDF):
+        def header(self):
+            self.set_font('Arial', 'B', 15)
+            self.cell(0, 10, 'Chatbot Report', ln=True, align='C')
+
+    pdf = PDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    for number, turn in enumerate(get_conversation_store().iter_turns(session_id), start=1):
+        pdf.multi_cell(0, 10, _latin1(f"Q{number}: {turn['question']}"))
+        pdf.multi_cell(0, 10, _latin1(f"A{number}: {turn['answer']}"))
+        pdf.ln(10)
+    pdf.output(path)
+    return path
@@ -0,0 +1,161 @@
+# utils/document_index.py
+import threading
+import numpy as np
+from utils.resources import get_resource
+from utils.storage import open_store
+
+DOCUMENT_INDEX_FILE = 'data/document_vectors.sqlite'
+
+
+class DocumentIndex:
+    """One centroid vector per document (doc_key), kept up to date at ingest time.
+
+    The sum of chunk embeddings and the chunk count are stored rather than
+    the mean, so chunks can be added and removed incrementally. Queries are
+    a single matrix product over the normalised centroids. Changes committed
+    by another process are picked up by reloading from SQLite before the
+    next search or write.
+    """
+
+    def __init__(self, path=DOCUMENT_INDEX_FILE):
+        self._lock = threading.RLock()
+        self._documents = {}  # doc_key -> [pdf_name, vector sum, chunk count]
+        self._matrix = None  # (doc_keys, pdf_names, normalised centroids), rebuilt after changes
+        self._conn = open_store(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            'doc_key TEXT PRIMARY KEY, pdf_name TEXT, vector_sum BLOB NOT NULL, chunks INTEGER NOT NULL)'
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        self._documents.clear()
+        self._matrix = None
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        for doc_key, pdf_name, vector_sum, chunks in self._conn.execute(
+                'SELECT doc_key, pdf_name, vector_sum, chunks FROM documents'):
+            self._documents[doc_key] = [pdf_name, np.frombuffer(vector_sum, dtype=np.float64).copy(), chunks]
+
+    def _sync(self):
+        # data_version only moves when another connection commits, never for our own writes
+        if self._conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version:
+            self._load()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _apply(self, chunks, sign):
+        with self._lock:
+            self._sync()
+            changed = set()
+            for chunk in chunks:
+                if chunk.get('embedding') is None:
+                    continue
+                metadata = chunk['metadata']
+                doc_key = metadata.get('doc_key', metadata.get('pdf_name'))
+                vector = np.asarray(chunk['embedding'], dtype=np.float64)
+                entry = self._documents.get(doc_key)
+                if entry is None:
+                    entry = self._documents[doc_key] = [metadata.get('pdf_name'), np.zeros_like(vector), 0]
+                if sign > 0:
+                    entry[0] = metadata.get('pdf_name', entry[0])
+                entry[1] += sign * vector
+                entry[2] += sign
+                changed.add(doc_key)
+            self._save(changed)
+
+    def _save(self, doc_keys):
+        if not doc_keys:
+            return
+        for doc_key in doc_keys:
+            pdf_name, vector_sum, chunks = self._documents[doc_key]
+            if chunks <= 0:
+                del self._documents[doc_key]
+                self._conn.execute('DELETE FROM documents WHERE doc_key = ?', (doc_key,))
+            else:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO documents (doc_key, pdf_name, vector_sum, chunks) VALUES (?, ?, ?, ?)',
+                    (doc_key, pdf_name, vector_sum.tobytes(), chunks)
+                )
+        self._conn.commit()
+        self._matrix = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Ingestion listener interface (see utils.ingest_pipeline.ingest_pdf)
+    def on_added(self, chunks):
+        self._apply(chunks, 1)
+
+    def on_removed(self, chunks):
+        self._apply(chunks, -1)
+
+    def on_updated(self, chunks):
+        # Reused chunks keep their vectors; only the stored file name can change
+        with self._lock:
+            self._sync()
+            changed = set()
+            for chunk in chunks:
+                metadata = chunk['metadata']
+                entry = self._documents.get(metadata.get('doc_key', metadata.get('pdf_name')))
+                if entry is not None and entry[0] != metadata.get('pdf_name'):
+                    entry[0] = metadata.get('pdf_name')
+                    changed.add(metadata.get('doc_key', metadata.get('pdf_name')))
+            self._save(changed)
+
+    def rebuild(self, collection, page_size=1000):
+        """One-off backfill from chunks already in the collection."""
+        from utils.chroma_manager import iter_collection
+        with self._lock:
+            self._documents.clear()
+            self._conn.execute('DELETE FROM documents')
+            self._conn.commit()
+            self._matrix = None
+        for chunks in iter_collection(collection, ['metadatas', 'embeddings'], page_size):
+            self.on_added(chunks)
+
+    def _centroids(self):
+        with self._lock:
+            self._sync()
+            if self._matrix is None:
+                doc_keys = list(self._documents)
+                if doc_keys:
+                    matrix = np.stack([self._documents[key][1] / self._documents[key][2] for key in doc_keys])
+                    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                    matrix = matrix / np.where(norms == 0, 1, norms)
+                else:
+                    matrix = np.zeros((0, 0))
+                self._matrix = (doc_keys, [self._documents[key][0] for key in doc_keys], matrix)
+            return self._matrix
+
+    def search(self, vector, k=5, exclude=()):
+        """Top-k documents by cosine similarity to the vector, as [(pdf_name, score)]."""
+        doc_keys, pdf_names, matrix = self._centroids()
+        if not doc_keys:
+            return []
+        vector = np.asarray(vector, dtype=np.float64)
+        scores = matrix @ (vector / (np.linalg.norm(vector) or 1))
+        results = []
+        for index in np.argsort(-scores):
+            pdf_name = pdf_names[index]
+            if doc_keys[index] in exclude or pdf_name in exclude:
+                continue
+            results.append((pdf_name, float(scores[index])))
+            if len(results) == k:
+                break
+        return results
+
+    def similar_to(self, pdf_name, k=5):
+        """Documents closest to a stored one (by doc_key or file name); no embedding call needed."""
+        with self._lock:
+            self._sync()
+            for doc_key, (name, vector_sum, chunks) in self._documents.items():
+                if pdf_name in (doc_key, name):
+                    return self.search(vector_sum / chunks, k=k, exclude=(doc_key,))
+        return []
+
+
+def get_document_index():
+    return get_resource('document_index', DocumentIndex)
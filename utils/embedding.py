@@ -0,0 +1,138 @@
+# utils/embedding.py
+import hashlib
+import math
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import span, get_metrics
+
+# Batching limits for embedding requests
+EMBED_BATCH_SIZE = 64
+EMBED_MAX_BATCH_TOKENS = 100_000
+# Number of embedding requests allowed in flight at once
+EMBED_CONCURRENCY = 4
+EMBED_MAX_RETRIES = 5
+EMBED_RETRY_BASE_DELAY = 1.0
+# Number of records written to Chroma per add call
+CHROMA_ADD_BATCH_SIZE = 256
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def make_batches(chunks, batch_size=EMBED_BATCH_SIZE, max_tokens=EMBED_MAX_BATCH_TOKENS):
+    """Group chunk dicts into batches bounded by count and estimated tokens."""
+    batch, tokens = [], 0
+    for chunk in chunks:
+        chunk_tokens = estimate_tokens(chunk['document'])
+        if batch and (len(batch) >= batch_size or tokens + chunk_tokens > max_tokens):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(chunk)
+        tokens += chunk_tokens
+    if batch:
+        yield batch
+
+
+def embed_with_retry(embedder, texts, max_retries=EMBED_MAX_RETRIES, base_delay=EMBED_RETRY_BASE_DELAY):
+    """Call embedder.embed_documents, retrying with exponential backoff and jitter."""
+    attempt = 0
+    while True:
+        try:
+            with span('embed', texts=len(texts)):
+                vectors = embedder.embed_documents(texts)
+            get_metrics().increment('embedded_texts', len(texts))
+            return vectors
+        except Exception:
+            get_metrics().increment('embed_retries')
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            time.sleep(base_delay * (2 ** (attempt - 1)) * (1 + random.random()))
+
+
+def embed_chunks(chunks, embedder, batch_size=EMBED_BATCH_SIZE, max_tokens=EMBED_MAX_BATCH_TOKENS,
+                 concurrency=EMBED_CONCURRENCY, max_retries=EMBED_MAX_RETRIES):
+    """Embed chunk dicts in batches, yielding each batch (in order) with an 'embedding' added.
+
+    At most `concurrency` batches are in flight; the input iterator is only
+    advanced when a slot frees up, so a slow embedder applies backpressure.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for batch in make_batches(chunks, batch_size, max_tokens):
+            texts = [chunk['document'] for chunk in batch]
+            pending.append((batch, executor.submit(embed_with_retry, embedder, texts, max_retries)))
+            if len(pending) >= concurrency:
+                yield _attach_embeddings(*pending.popleft())
+        while pending:
+            yield _attach_embeddings(*pending.popleft())
+
+
+def _attach_embeddings(batch, future):
+    vectors = future.result()
+    for chunk, vector in zip(batch, vectors):
+        chunk['embedding'] = vector
+    return batch
+
+
+def add_in_batches(collection, batches, batch_size=CHROMA_ADD_BATCH_SIZE):
+    """Write embedded chunk batches to a Chroma collection in bounded add calls.
+
+    Generator: yields each list of chunks once it has been written.
+    """
+    buffer = []
+    for batch in batches:
+        buffer.extend(batch)
+        while len(buffer) >= batch_size:
+            written, buffer = buffer[:batch_size], buffer[batch_size:]
+            _add(collection, written)
+            yield written
+    if buffer:
+        _add(collection, buffer)
+        yield buffer
+
+
+def _add(collection, docs):
+    with span('chroma_add', chunks=len(docs)):
+        collection.add(
+            documents=[doc['document'] for doc in docs],
+            metadatas=[doc['metadata'] for doc in docs],
+            ids=[doc['id'] for doc in docs],
+            embeddings=[doc['embedding'] for doc in docs]
+        )
+    get_metrics().increment('chunks_added', len(docs))
+
+
+class LocalEmbedder:
+    """Deterministic offline stand-in for OpenAIEmbeddings.
+
+    Vectors are derived from token hashes, so identical texts always get the
+    same embedding. `latency` (seconds per request) simulates network cost.
+    """
+
+    def __init__(self, dimensions=256, latency=0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.requests = 0
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for token in text.lower().split():
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
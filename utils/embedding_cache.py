@@ -0,0 +1,145 @@
+# utils/embedding_cache.py
+import hashlib
+import threading
+import time
+from array import array
+from langchain.embeddings.base import Embeddings
+from utils.storage import open_store
+
+CACHE_FILE = 'data/embedding_cache.sqlite'
+# Evict least recently used vectors beyond this many entries
+CACHE_MAX_ENTRIES = 200_000
+
+
+class EmbeddingCache:
+    """On-disk embedding store keyed by sha256(text) + model name.
+
+    Vectors are stored as packed float32 blobs. Entries beyond `max_entries`
+    are evicted least-recently-used first.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = open_store(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(text, model):
+        return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys present, refreshing their LRU timestamp."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    'UPDATE embeddings SET last_used = ? WHERE key = ?', [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)',
+                [(key, array('f', vector).tobytes(), now) for key, vector in items]
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                'DELETE FROM embeddings WHERE key IN '
+                '(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)',
+                (count - self.max_entries,)
+            )
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': entries
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that consults an EmbeddingCache before calling the underlying model."""
+
+    def __init__(self, embedder, cache=None, model_name=None):
+        self.embedder = embedder
+        self.cache = cache or get_embedding_cache()
+        self.model_name = model_name or getattr(embedder, 'model', None) or type(embedder).__name__
+
+    def embed_documents(self, texts):
+        keys = [EmbeddingCache.make_key(text, self.model_name) for text in texts]
+        return self._embed_cached(keys, texts)
+
+    def embed_queries(self, texts):
+        """embed_query for many texts, sharing its 'query:' cache entries.
+
+        Missing queries go to the model in one batch; OpenAI embeddings are the
+        same for a text whether it is embedded as a query or a document.
+        """
+        keys = [EmbeddingCache.make_key('query:' + text, self.model_name) for text in texts]
+        return self._embed_cached(keys, texts)
+
+    def _embed_cached(self, keys, texts):
+        found = self.cache.get_many(keys)
+        # Embed each distinct missing text once
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in found and key not in missing:
+                missing[key] = texts[i]
+        if missing:
+            vectors = self.embedder.embed_documents(list(missing.values()))
+            new_items = list(zip(missing, vectors))
+            found.update(new_items)
+            self.cache.put_many(new_items)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        key = EmbeddingCache.make_key('query:' + text, self.model_name)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+        vector = self.embedder.embed_query(text)
+        self.cache.put_many([(key, vector)])
+        return vector
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide EmbeddingCache instance."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
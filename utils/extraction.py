@@ -0,0 +1,127 @@
+# utils/extraction.py
+import hashlib
+import multiprocessing
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pdfplumber
+import pytesseract
+from utils.metrics import record_timings
+from utils.resources import get_resource, invalidate
+
+# Pages handed to a worker process per task
+PAGES_PER_TASK = 8
+# Extraction processes shared by every ingestion in this process
+EXTRACT_WORKERS = os.cpu_count() or 1
+# Tasks a single document keeps in flight per worker; bounds the pages held in memory
+TASKS_PER_WORKER = 2
+OCR_RESOLUTION = 300
+
+# text is None when OCR was skipped because the page fingerprint was already known
+PageText = namedtuple('PageText', ['page', 'text', 'fingerprint'])
+
+
+def _ocr(page):
+    pil_image = page.to_image(resolution=OCR_RESOLUTION).original
+    return pytesseract.image_to_string(pil_image)
+
+
+def extract_page(page, skip_fingerprints=(), timings=None):
+    """Return (text, fingerprint) for a pdfplumber page, falling back to OCR for image-only pages.
+
+    The fingerprint hashes the page text, or the raw image streams of pages
+    without a text layer. OCR is skipped for image pages whose fingerprint is
+    in `skip_fingerprints`. If `timings` is a list, ('ocr', seconds) is
+    appended to it when OCR runs.
+    """
+    text = page.extract_text()
+    if text:
+        return text, hashlib.md5(text.encode('utf-8')).hexdigest()
+    digest = hashlib.md5()
+    for image in page.images:
+        digest.update(image['stream'].get_rawdata() or b'')
+    fingerprint = digest.hexdigest()
+    if fingerprint in skip_fingerprints:
+        return None, fingerprint
+    start = time.perf_counter()
+    text = _ocr(page)
+    if timings is not None:
+        timings.append(('ocr', time.perf_counter() - start))
+    return text, fingerprint
+
+
+def count_pages(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_page_range(pdf_path, start, end, skip_fingerprints=()):
+    # Runs in a worker process: open the PDF once per range and release each page's cache.
+    # Timings go back with the results, since metrics recorded here would stay in the worker.
+    results, timings = [], []
+    with pdfplumber.open(pdf_path) as pdf:
+        for index in range(start, end):
+            page_start = time.perf_counter()
+            page = pdf.pages[index]
+            results.append(PageText(index + 1, *extract_page(page, skip_fingerprints, timings)))
+            page.close()
+            timings.append(('extract_page', time.perf_counter() - page_start))
+    return results, timings
+
+
+def _collect(result):
+    pages, timings = result
+    record_timings(timings)
+    return pages
+
+
+def extract_single_page(pdf_path, page_number):
+    """Extract one page (1-based) in the current process, always running OCR if needed."""
+    return _collect(_extract_page_range(pdf_path, page_number - 1, page_number))[0]
+
+
+def _create_pool():
+    # Ingestion runs on threads (pipeline stages, job workers, the API), and
+    # forking a multithreaded process can deadlock, so never use fork here
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context(method))
+
+
+def get_extraction_pool():
+    """Process pool shared by all concurrent extractions, so jobs queue for cores instead of oversubscribing."""
+    return get_resource('extraction.pool', _create_pool)
+
+
+def iter_pages(pdf_path, pages_per_task=PAGES_PER_TASK, tasks_per_worker=TASKS_PER_WORKER, skip_fingerprints=()):
+    """Yield PageText(page, text, fingerprint) for every page of the PDF, in page order (1-based).
+
+    Page ranges are extracted in the shared process pool. New ranges are only
+    submitted once earlier ones have been consumed, so at most
+    EXTRACT_WORKERS * tasks_per_worker * pages_per_task pages of a document
+    are held in memory regardless of its size.
+    """
+    total = count_pages(pdf_path)
+    if EXTRACT_WORKERS == 1 or total <= pages_per_task:
+        yield from _collect(_extract_page_range(pdf_path, 0, total, skip_fingerprints))
+        return
+
+    executor = get_extraction_pool()
+    max_pending = max(1, EXTRACT_WORKERS * tasks_per_worker)
+    pending = deque()
+    try:
+        for start in range(0, total, pages_per_task):
+            end = min(start + pages_per_task, total)
+            pending.append(executor.submit(_extract_page_range, pdf_path, start, end, skip_fingerprints))
+            if len(pending) >= max_pending:
+                yield from _collect(pending.popleft().result())
+        while pending:
+            yield from _collect(pending.popleft().result())
+    except BrokenProcessPool:
+        # A worker died (e.g. killed by the OOM killer); the next extraction gets a fresh pool
+        invalidate('extraction.pool')
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
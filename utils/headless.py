@@ -0,0 +1,183 @@
+# utils/headless.py
+import hashlib
+import json
+import os
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.jobs import INGEST_WORKERS
+
+# Questions answered concurrently in batch mode
+BATCH_CONCURRENCY = 4
+
+
+def find_pdfs(directory, recursive=True):
+    """Paths of the PDF files under a directory, sorted."""
+    if not recursive:
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith('.pdf')
+        )
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory) for name in names if name.lower().endswith('.pdf')
+    )
+
+
+def resolve_ingest_path(path, root):
+    """Real path of `path` (relative paths are taken from `root`), refusing anything outside root."""
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise PermissionError(f"{path} is outside the ingest directory")
+    return resolved
+
+
+def ingest_file(pdf_path, tags=None, version_of=None):
+    """store_pdf with the outcome as a JSON-friendly dict (errors are reported, not raised)."""
+    from utils.pdf_handler import store_pdf
+    start = time.perf_counter()
+    result = {'path': pdf_path}
+    try:
+        status, pdf_name, counts = store_pdf(pdf_path, tags=tags, version_of=version_of)
+        result.update(status=status, pdf_name=pdf_name, chunks=counts.get('upsert', 0),
+                      reused=counts.get('reused', 0))
+    except Exception as e:
+        traceback.print_exc()
+        result.update(status='failed', error=str(e))
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def ingest_paths(pdf_paths, tags=None, workers=INGEST_WORKERS):
+    """Ingest PDFs with at most `workers` in parallel, yielding each result as it finishes."""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(ingest_file, pdf_path, tags) for pdf_path in pdf_paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def save_upload(stream, file_name, tags=None, version_of=None):
+    """Write an uploaded PDF (an iterable of byte blocks) to data/pdfs and queue it for ingestion.
+
+    Returns (status, job_id) like utils.upload_manifest.register_upload.
+    """
+    from utils.jobs import get_job_queue
+    from utils.pdf_handler import PDF_DIR
+    from utils.upload_manifest import check_known_content, get_upload_manifest
+
+    if not os.path.exists(PDF_DIR):
+        os.makedirs(PDF_DIR)
+    temp_path = os.path.join(PDF_DIR, f".upload_{os.getpid()}_{time.time_ns()}.tmp")
+    hash_md5 = hashlib.md5()
+    try:
+        with open(temp_path, 'wb') as f:
+            for block in stream:
+                hash_md5.update(block)
+                f.write(block)
+    except BaseException:
+        # An aborted upload must not leave a partial file behind
+        os.remove(temp_path)
+        raise
+    pdf_hash = hash_md5.hexdigest()
+
+    upload_id = os.path.basename(temp_path)
+    known = check_known_content(upload_id, pdf_hash, file_name)
+    if known is not None:
+        os.remove(temp_path)
+        return known
+    base_name, ext = os.path.splitext(os.path.basename(file_name))
+    stored_path = os.path.join(PDF_DIR, f"{base_name}_{pdf_hash[:8]}{ext or '.pdf'}")
+    os.replace(temp_path, stored_path)
+    job_id = get_job_queue().submit(stored_path, tags=tags, display_name=os.path.basename(file_name),
+                                    pdf_hash=pdf_hash, version_of=version_of)
+    get_upload_manifest().record(upload_id, pdf_hash, file_name, stored_path=stored_path, job_id=job_id)
+    return 'queued', job_id
+
+
+def queue_path(pdf_path, tags=None, version_of=None):
+    """Queue a PDF already on the server for ingestion, unless its content is known.
+
+    Returns (status, job_id) like utils.upload_manifest.register_upload.
+    """
+    from utils.jobs import get_job_queue
+    from utils.pdf_handler import compute_md5
+    from utils.upload_manifest import check_known_content, get_upload_manifest
+
+    pdf_hash = compute_md5(pdf_path)
+    upload_id = f"path:{pdf_path}"
+    known = check_known_content(upload_id, pdf_hash, os.path.basename(pdf_path))
+    if known is not None:
+        return known
+    job_id = get_job_queue().submit(pdf_path, tags=tags, pdf_hash=pdf_hash, version_of=version_of)
+    get_upload_manifest().record(upload_id, pdf_hash, os.path.basename(pdf_path), stored_path=pdf_path,
+                                 job_id=job_id)
+    return 'queued', job_id
+
+
+def answer_question(question, chat_history=(), response_style="Formal", language="English", filters=None):
+    from utils.conversation_store import source_refs
+    from utils.retrieval import get_answer_conversational
+    start = time.perf_counter()
+    answer, source_documents = get_answer_conversational(
+        question, list(chat_history), response_style=response_style, language=language, filters=filters or None
+    )
+    return {
+        'question': question,
+        'answer': answer,
+        'sources': source_refs(source_documents),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def run_request(request, ingest_root=None):
+    """Execute one batch request: {"op": "ingest" | "ask" | "recommend" | "similar" | "summarize", ...}.
+
+    With `ingest_root`, ingest paths must lie inside that directory.
+    """
+    from utils.recommendations import get_recommendations, get_similar_documents
+    from utils.summarization import summarize_documents
+
+    op = request.get('op', 'ask')
+    if op == 'ingest':
+        path = request['path'] if ingest_root is None else resolve_ingest_path(request['path'], ingest_root)
+        return ingest_file(path, tags=request.get('tags'), version_of=request.get('version_of'))
+    if op == 'ask':
+        return answer_question(
+            request['question'], request.get('chat_history', ()), request.get('response_style', "Formal"),
+            request.get('language', "English"), request.get('filters')
+        )
+    if op == 'recommend':
+        return {'query': request['query'], 'pdf_names': get_recommendations(request['query'], k=request.get('k', 5))}
+    if op == 'similar':
+        return {'pdf_name': request['pdf_name'],
+                'pdf_names': get_similar_documents([request['pdf_name']], k=request.get('k', 5))}
+    if op == 'summarize':
+        return {'summary': summarize_documents()}
+    raise ValueError(f"Unknown op: {op}")
+
+
+def run_batch(lines, concurrency=BATCH_CONCURRENCY, ingest_root=None):
+    """Run JSONL requests concurrently, yielding one result dict per line in input order.
+
+    Each result carries the line number and, if the request failed, an error
+    instead of aborting the batch.
+    """
+    def run(line_number, line):
+        try:
+            request = json.loads(line)
+            return dict(run_request(request, ingest_root=ingest_root), line=line_number, op=request.get('op', 'ask'))
+        except Exception as e:
+            return {'line': line_number, 'error': str(e)}
+
+    # Lines are read only as slots free up, so arbitrarily long inputs stream through
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        pending = deque()
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            pending.append(executor.submit(run, line_number, line))
+            if len(pending) >= concurrency * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
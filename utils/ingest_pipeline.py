@@ -0,0 +1,267 @@
+# utils/ingest_pipeline.py
+import queue
+import threading
+from collections import OrderedDict
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from utils.embedding import embed_chunks, add_in_batches
+from utils.extraction import iter_pages, extract_single_page
+from utils.metrics import span
+
+# Items buffered between two consecutive stages
+STAGE_QUEUE_SIZE = 4
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+_DONE = object()
+
+
+class IngestCancelled(Exception):
+    """Raised from an on_progress callback to stop an ingestion run."""
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class StagePipeline:
+    """Chain of generator stages connected by bounded queues.
+
+    Every stage except the last runs in its own thread; the last stage is
+    driven by the caller of run(). `counts` holds the number of items each
+    stage has produced so far.
+    """
+
+    def __init__(self, queue_size=STAGE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.stages = []
+        self.counts = OrderedDict()
+
+    def add(self, name, stage, weight=None):
+        """Append a stage: a callable mapping an iterator to an iterator.
+
+        `weight(item)` gives how many items a produced value counts as
+        (e.g. len for stages that yield batches).
+        """
+        self.stages.append((name, stage, weight))
+        self.counts[name] = 0
+        return self
+
+    def run(self, source):
+        stop = threading.Event()
+        threads = []
+        stream = iter(source)
+        try:
+            for position, (name, stage, weight) in enumerate(self.stages):
+                stream = self._counted(name, stage(stream), weight)
+                if position < len(self.stages) - 1:
+                    stream = self._pump(stream, stop, threads)
+            yield from stream
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _counted(self, name, stream, weight):
+        for item in stream:
+            self.counts[name] += weight(item) if weight else 1
+            yield item
+
+    def _pump(self, stream, stop, threads):
+        buffer = queue.Queue(maxsize=self.queue_size)
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def run():
+            try:
+                for item in stream:
+                    if not put(item):
+                        return
+                put(_DONE)
+            except BaseException as e:
+                put(_Failure(e))
+            finally:
+                stream.close()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        threads.append(thread)
+        return self._drain(buffer, stop)
+
+    @staticmethod
+    def _drain(buffer, stop):
+        while True:
+            try:
+                item = buffer.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+
+
+def split_pages(pages, metadata, id_prefix, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Split each page into chunk dicts carrying the shared metadata plus the page number.
+
+    Chunk ids are derived from the page number, so re-running a page
+    produces the same ids.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    for page in pages:
+        with span('split'):
+            texts = text_splitter.split_text(page.text)
+        for idx, chunk in enumerate(texts):
+            yield {
+                'id': f"{id_prefix}_{page.page}_{idx}",
+                'document': chunk,
+                'metadata': dict(metadata, page=page.page, page_hash=page.fingerprint)
+            }
+
+
+def load_page_index(collection, doc_key):
+    """Map page fingerprint -> list of chunk-id groups (one group per stored page) for a document."""
+    existing = collection.get(where={'doc_key': doc_key}, include=['metadatas'])
+    pages = {}
+    for chunk_id, chunk_metadata in zip(existing['ids'], existing['metadatas']):
+        key = (chunk_metadata.get('page_hash'), chunk_metadata.get('page'))
+        pages.setdefault(key, []).append(chunk_id)
+    index = {}
+    for (page_hash, _), ids in pages.items():
+        index.setdefault(page_hash, []).append(ids)
+    return index
+
+
+def diff_pages(pages, page_index, reused, pdf_path):
+    """Yield only pages whose fingerprint is not already stored.
+
+    Unchanged pages consume a matching group from `page_index` and are
+    recorded in `reused` as (page number, fingerprint, chunk ids).
+    """
+    for page in pages:
+        groups = page_index.get(page.fingerprint)
+        if groups:
+            reused.append((page.page, page.fingerprint, groups.pop()))
+            if not groups:
+                del page_index[page.fingerprint]
+            continue
+        if page.text is None:
+            # OCR was skipped but every stored copy of this page is already taken
+            page = extract_single_page(pdf_path, page.page)
+        yield page
+
+
+def ingest_pdf(pdf_path, collection, embedder, metadata, id_prefix, on_progress=None, listeners=()):
+    """Stream a PDF through extract -> diff -> split -> embed -> upsert.
+
+    Pages already stored for metadata['doc_key'] (matched by fingerprint)
+    are not re-embedded; their chunks only get refreshed metadata. Chunks of
+    pages that no longer exist are deleted. Returns the per-stage item
+    counts plus 'reused' and 'removed' chunk counts. `on_progress(counts)`
+    is called from the caller's thread after every upserted batch.
+
+    Each listener (a side index kept in step with the collection) gets
+    on_added(chunks) for every written batch, on_updated(chunks) for reused
+    chunks whose metadata was refreshed (id and metadata only) and
+    on_removed(chunks) for deleted chunks. Added and removed chunks are
+    dicts with id, document, metadata and embedding.
+    """
+    page_index = load_page_index(collection, metadata['doc_key'])
+    reused = []
+
+    pipeline = StagePipeline()
+    pipeline.add('extract', lambda _: iter_pages(pdf_path, skip_fingerprints=frozenset(page_index)))
+    pipeline.add('diff', lambda pages: diff_pages(pages, page_index, reused, pdf_path))
+    pipeline.add('split', lambda pages: split_pages(pages, metadata, id_prefix))
+    pipeline.add('embed', lambda chunks: embed_chunks(chunks, embedder), weight=len)
+    pipeline.add('upsert', lambda batches: add_in_batches(collection, batches), weight=len)
+    for written in pipeline.run([None]):
+        for listener in listeners:
+            listener.on_added(written)
+        if on_progress:
+            on_progress(pipeline.counts)
+
+    # Point unchanged chunks at the new version, then drop chunks of removed or edited pages
+    reused_ids, reused_metadatas = [], []
+    for page_number, fingerprint, ids in reused:
+        for chunk_id in ids:
+            reused_ids.append(chunk_id)
+            reused_metadatas.append(dict(metadata, page=page_number, page_hash=fingerprint))
+    if reused_ids:
+        collection.update(ids=reused_ids, metadatas=reused_metadatas)
+        updated_chunks = [
+            {'id': chunk_id, 'metadata': chunk_metadata}
+            for chunk_id, chunk_metadata in zip(reused_ids, reused_metadatas)
+        ]
+        for listener in listeners:
+            listener.on_updated(updated_chunks)
+    removed_ids = [chunk_id for groups in page_index.values() for ids in groups for chunk_id in ids]
+    delete_chunks(collection, removed_ids, listeners)
+
+    counts = dict(pipeline.counts)
+    counts['reused'] = len(reused_ids)
+    counts['removed'] = len(removed_ids)
+    return counts
+
+
+def delete_chunks(collection, ids, listeners=()):
+    """Delete chunks from the collection, telling listeners what is being removed."""
+    if not ids:
+        return
+    if listeners:
+        removed = collection.get(ids=ids, include=['documents', 'metadatas', 'embeddings'])
+        removed_chunks = [
+            {'id': chunk_id, 'document': document, 'metadata': chunk_metadata, 'embedding': embedding}
+            for chunk_id, document, chunk_metadata, embedding in zip(
+                removed['ids'], removed['documents'], removed['metadatas'], removed['embeddings']
+            )
+        ]
+        for listener in listeners:
+            listener.on_removed(removed_chunks)
+    collection.delete(ids=ids)
+
+
+def rollback_pdf(collection, pdf_hash, listeners=()):
+    """Remove every chunk written for this version of a document (e.g. after a failed run).
+
+    Chunks reused from an earlier version keep their original ids, so only
+    ids with this version's prefix are deleted.
+    """
+    stored = collection.get(where={'pdf_hash': pdf_hash}, include=[])
+    delete_chunks(collection, [chunk_id for chunk_id in stored['ids'] if chunk_id.startswith(f"{pdf_hash}_")], listeners)
+
+
+def trim_partial_page(collection, pdf_hash, listeners=(), indexed=None):
+    """Prepare an interrupted run for resuming.
+
+    A batch is written to the collection before the listeners hear of it,
+    so a run that died in between leaves chunks no side index knows about.
+    `indexed(ids)` returns the subset of ids the listeners have seen (the
+    last listener's record); the rest are deleted without notifying them.
+    Chunks are written in page order, so of the remaining chunks only the
+    highest page can be incomplete; it is deleted too and the page diff of
+    the next run re-processes both.
+    """
+    stored = collection.get(where={'pdf_hash': pdf_hash}, include=['metadatas'])
+    if not stored['ids']:
+        return
+    chunks = list(zip(stored['ids'], stored['metadatas']))
+    if indexed is not None:
+        known = indexed(stored['ids'])
+        delete_chunks(collection, [chunk_id for chunk_id, _ in chunks if chunk_id not in known])
+        chunks = [(chunk_id, chunk_metadata) for chunk_id, chunk_metadata in chunks if chunk_id in known]
+        if not chunks:
+            return
+    last_page = max(chunk_metadata.get('page', 0) for _, chunk_metadata in chunks)
+    partial_ids = [chunk_id for chunk_id, chunk_metadata in chunks if chunk_metadata.get('page', 0) == last_page]
+    delete_chunks(collection, partial_ids, listeners)
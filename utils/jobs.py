@@ -0,0 +1,263 @@
+# utils/jobs.py
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from utils.ingest_pipeline import IngestCancelled
+from utils.resources import get_resource
+from utils.storage import open_store
+
+JOBS_FILE = 'data/jobs.sqlite'
+# Number of PDFs ingested concurrently in the background
+INGEST_WORKERS = 2
+POLL_INTERVAL = 1.0
+# Running jobs are leased: their owner refreshes the heartbeat every
+# HEARTBEAT_INTERVAL seconds, and only jobs silent for LEASE_TIMEOUT are requeued
+HEARTBEAT_INTERVAL = 10.0
+LEASE_TIMEOUT = 60.0
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+DUPLICATE = 'duplicate'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, DUPLICATE, FAILED, CANCELLED)
+
+
+class JobQueue:
+    """Persistent ingestion queue in SQLite.
+
+    Each job tracks one PDF: status, progress (0..1), a short message and
+    the error if it failed. Several processes (the Streamlit app, the API)
+    may share the file: a claimed job records its owner and a heartbeat, and
+    only jobs whose lease expired (their process crashed or hung) are put
+    back in the queue with resume set, so ingestion continues where it
+    stopped instead of starting over.
+    """
+
+    def __init__(self, path=JOBS_FILE):
+        self._lock = threading.Lock()
+        self._conn = open_store(path, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pdf_path TEXT NOT NULL,
+                pdf_hash TEXT,
+                version_of TEXT,
+                display_name TEXT NOT NULL,
+                tags TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                error TEXT,
+                resume INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                heartbeat REAL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL)
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)')
+        columns = [row['name'] for row in self._conn.execute('PRAGMA table_info(jobs)')]
+        if 'pdf_hash' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN pdf_hash TEXT')
+        if 'version_of' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN version_of TEXT')
+        if 'owner' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN heartbeat REAL')
+        # Identifies this queue instance (one per process) as the owner of the jobs it claims
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def submit(self, pdf_path, tags=None, display_name=None, pdf_hash=None, version_of=None):
+        """Queue a PDF; `version_of` is the doc_key of a stored document it replaces."""
+        now = time.time()
+        cursor = self._execute(
+            'INSERT INTO jobs (pdf_path, pdf_hash, version_of, display_name, tags, status, created, updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (pdf_path, pdf_hash, version_of, display_name or os.path.basename(pdf_path), json.dumps(tags or []),
+             QUEUED, now, now)
+        )
+        return cursor.lastrowid
+
+    def claim(self):
+        """Atomically move the oldest queued job to running, owned by this queue, and return it (or None).
+
+        Jobs whose lease has expired are requeued first.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                self._requeue_expired(now)
+                row = self._conn.execute(
+                    'SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1', (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        'UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, updated = ? WHERE id = ?',
+                        (RUNNING, self.owner, now, now, row['id'])
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return dict(row, status=RUNNING, owner=self.owner, heartbeat=now) if row is not None else None
+
+    def update_progress(self, job_id, progress, message=None):
+        """Record progress (and renew the lease); returns True if cancellation has been requested."""
+        now = time.time()
+        self._execute(
+            'UPDATE jobs SET progress = ?, message = ?, heartbeat = ?, updated = ? WHERE id = ? AND owner = ?',
+            (progress, message, now, now, job_id, self.owner)
+        )
+        row = self._execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def finish(self, job_id, status, message=None, error=None):
+        # A job whose lease was lost has been requeued; its new owner reports the outcome
+        progress = 1.0 if status in (DONE, DUPLICATE) else None
+        self._execute(
+            'UPDATE jobs SET status = ?, message = ?, error = ?, progress = COALESCE(?, progress), updated = ? '
+            'WHERE id = ? AND owner = ?',
+            (status, message, error, progress, time.time(), job_id, self.owner)
+        )
+
+    def heartbeat(self):
+        """Renew the lease of every job this queue is running."""
+        self._execute(
+            'UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = ?', (time.time(), self.owner, RUNNING)
+        )
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately, or ask a running one to stop."""
+        self._execute(
+            'UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status = ?',
+            (CANCELLED, time.time(), job_id, QUEUED)
+        )
+        self._execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?', (job_id, RUNNING))
+
+    def retry(self, job_id):
+        """Queue a failed or cancelled job again."""
+        self._execute(
+            'UPDATE jobs SET status = ?, resume = 1, cancel_requested = 0, error = NULL, updated = ? '
+            'WHERE id = ? AND status IN (?, ?)',
+            (QUEUED, time.time(), job_id, FAILED, CANCELLED)
+        )
+
+    def _requeue_expired(self, now):
+        self._conn.execute(
+            'UPDATE jobs SET status = ?, resume = 1, owner = NULL, updated = ? '
+            'WHERE status = ? AND (heartbeat IS NULL OR heartbeat < ?)',
+            (QUEUED, now, RUNNING, now - LEASE_TIMEOUT)
+        )
+
+    def recover(self):
+        """Requeue running jobs whose owner stopped renewing the lease (it crashed or hung).
+
+        Jobs another live process is working on are left alone.
+        """
+        with self._lock:
+            self._requeue_expired(time.time())
+
+    def get_job(self, job_id):
+        row = self._execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list_jobs(self, limit=20):
+        rows = self._execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def has_active_jobs(self):
+        row = self._execute('SELECT 1 FROM jobs WHERE status IN (?, ?) LIMIT 1', (QUEUED, RUNNING)).fetchone()
+        return row is not None
+
+
+class IngestWorkerPool:
+    """Background threads that take jobs from a JobQueue and ingest them with store_pdf."""
+
+    def __init__(self, job_queue, workers=INGEST_WORKERS):
+        self.job_queue = job_queue
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True) for i in range(workers)
+        ]
+        self._threads.append(threading.Thread(target=self._keep_leases, name="ingest-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _keep_leases(self):
+        # Long pages (OCR) can go well past LEASE_TIMEOUT without a progress update
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.job_queue.heartbeat()
+            except Exception:
+                traceback.print_exc()
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.job_queue.claim()
+            if job is None:
+                self._stop.wait(POLL_INTERVAL)
+                continue
+            self._process(job)
+
+    def _process(self, job):
+        from utils.pdf_handler import store_pdf
+
+        def on_progress(fraction, counts):
+            message = f"{counts['upsert']} chunks stored"
+            if self.job_queue.update_progress(job['id'], fraction, message):
+                raise IngestCancelled()
+
+        try:
+            status, unique_filename, counts = store_pdf(
+                job['pdf_path'], tags=json.loads(job['tags']), on_progress=on_progress,
+                original_name=job['display_name'], pdf_hash=job['pdf_hash'], version_of=job['version_of']
+            )
+        except IngestCancelled:
+            self.job_queue.finish(job['id'], CANCELLED, message="Cancelled")
+        except Exception as e:
+            traceback.print_exc()
+            self.job_queue.finish(job['id'], FAILED, error=str(e))
+        else:
+            if status == 'duplicate':
+                self.job_queue.finish(job['id'], DUPLICATE, message="Already embedded")
+            else:
+                self.job_queue.finish(
+                    job['id'], DONE,
+                    message=f"{unique_filename}: {counts.get('upsert', 0)} new, {counts.get('reused', 0)} reused chunks"
+                )
+
+
+def get_job_queue():
+    def create():
+        job_queue = JobQueue()
+        job_queue.recover()
+        return job_queue
+    return get_resource('jobs.queue', create)
+
+
+def start_ingest_workers(workers=INGEST_WORKERS):
+    """Start the process-wide worker pool once; later calls return the running pool."""
+    return get_resource('jobs.workers', lambda: IngestWorkerPool(get_job_queue(), workers))
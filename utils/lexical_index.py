@@ -0,0 +1,175 @@
+# utils/lexical_index.py
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from utils.resources import get_resource
+from utils.storage import open_store
+
+LEXICAL_INDEX_FILE = 'data/lexical_index.sqlite'
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Terms occurring in more than this fraction of chunks are skipped at query time
+MAX_TERM_DOC_FRACTION = 0.25
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were "
+    "what when where which who why will with how do does did can".split()
+)
+
+
+def tokenize(text):
+    """Lowercased word tokens; identifiers like 'AB-12.3' or '4.2.1' stay whole."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk texts, held in memory and persisted to SQLite.
+
+    add() and remove() update both the in-memory postings and the SQLite
+    file incrementally, so the index follows ingestion chunk by chunk.
+    Chunks written by another process (the app and the API share one
+    ingestion queue) are picked up by reloading from SQLite before the next
+    search or write.
+    """
+
+    def __init__(self, path=LEXICAL_INDEX_FILE):
+        self._lock = threading.RLock()
+        self._postings = {}  # term -> {chunk id: term frequency}
+        self._lengths = {}  # chunk id -> token count
+        self._total_length = 0
+        self._conn = open_store(path)
+        # One row per chunk; `terms` holds "term:tf" pairs separated by spaces
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, length INTEGER NOT NULL, terms TEXT NOT NULL)'
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        self._postings.clear()
+        self._lengths.clear()
+        self._total_length = 0
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        for chunk_id, length, terms in self._conn.execute('SELECT id, length, terms FROM chunks'):
+            self._lengths[chunk_id] = length
+            self._total_length += length
+            for pair in terms.split():
+                term, tf = pair.rsplit(':', 1)
+                self._postings.setdefault(term, {})[chunk_id] = int(tf)
+
+    def _sync(self):
+        # data_version only moves when another connection commits, never for our own writes
+        if self._conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version:
+            self._load()
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, ids, texts):
+        """Index (or re-index) chunks."""
+        with self._lock:
+            self._sync()
+            self._remove(ids)
+            rows = []
+            for chunk_id, text in zip(ids, texts):
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                self._lengths[chunk_id] = length
+                self._total_length += length
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[chunk_id] = tf
+                rows.append((chunk_id, length, ' '.join(f'{term}:{tf}' for term, tf in counts.items())))
+            self._conn.executemany('INSERT INTO chunks (id, length, terms) VALUES (?, ?, ?)', rows)
+            self._conn.commit()
+
+    def remove(self, ids):
+        with self._lock:
+            self._sync()
+            self._remove(ids)
+            self._conn.commit()
+
+    def _remove(self, ids):
+        ids = [chunk_id for chunk_id in ids if chunk_id in self._lengths]
+        if not ids:
+            return
+        for chunk_id in ids:
+            self._total_length -= self._lengths.pop(chunk_id)
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            placeholders = ','.join('?' * len(part))
+            rows = self._conn.execute(f'SELECT id, terms FROM chunks WHERE id IN ({placeholders})', part).fetchall()
+            for chunk_id, terms in rows:
+                for pair in terms.split():
+                    term = pair.rsplit(':', 1)[0]
+                    postings = self._postings.get(term)
+                    if postings is not None:
+                        postings.pop(chunk_id, None)
+                        if not postings:
+                            del self._postings[term]
+            self._conn.execute(f'DELETE FROM chunks WHERE id IN ({placeholders})', part)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def search(self, query, k=10, allowed_ids=None):
+        """Return up to k (chunk id, BM25 score) pairs, best first.
+
+        `allowed_ids`, if given, restricts scoring to that set of chunk ids.
+        """
+        with self._lock:
+            self._sync()
+            total = len(self._lengths)
+            if not total:
+                return []
+            average_length = self._total_length / total
+            max_df = max(1, int(total * MAX_TERM_DOC_FRACTION))
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings or (len(postings) > max_df and total > 20):
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    if allowed_ids is not None and chunk_id not in allowed_ids:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[chunk_id] / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def rebuild(self, collection, page_size=1000):
+        """One-off backfill from chunks already in the collection."""
+        from utils.chroma_manager import iter_collection
+        with self._lock:
+            self._postings.clear()
+            self._lengths.clear()
+            self._total_length = 0
+            self._conn.execute('DELETE FROM chunks')
+            self._conn.commit()
+        for chunks in iter_collection(collection, ['documents'], page_size):
+            self.on_added(chunks)
+
+    # Ingestion listener interface (see utils.ingest_pipeline.ingest_pdf)
+    def on_added(self, chunks):
+        self.add([chunk['id'] for chunk in chunks], [chunk['document'] for chunk in chunks])
+
+    def on_removed(self, chunks):
+        self.remove([chunk['id'] for chunk in chunks])
+
+    def on_updated(self, chunks):
+        # Only metadata changed; the indexed text is the same
+        pass
+
+
+def get_lexical_index():
+    def create():
+        index = LexicalIndex()
+        if not len(index):
+            # Backfill once for chunks ingested before the index existed
+            from utils.chroma_manager import get_collection
+            index.rebuild(get_collection())
+        return index
+    return get_resource('lexical_index', create)
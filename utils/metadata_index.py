@@ -0,0 +1,213 @@
+# utils/metadata_index.py
+import threading
+from utils.resources import get_resource
+from utils.storage import open_store
+
+METADATA_INDEX_FILE = 'data/metadata_index.sqlite'
+# Bumped when a rebuild must run again on existing installs (1: doc_key written back to legacy chunks)
+SCHEMA_VERSION = 1
+
+
+def normalize_tags(tags):
+    """Lowercased, stripped, de-duplicated tags from a list or a comma-joined string ('None' means no tags)."""
+    if not tags or tags == 'None':
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    normalized = []
+    for tag in tags:
+        tag = tag.strip().lower()
+        if tag and tag != 'none' and tag not in normalized:
+            normalized.append(tag)
+    return normalized
+
+
+def _prefix_upper_bound(prefix):
+    # Smallest string greater than every string starting with prefix, for an indexed range scan
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class MetadataIndex:
+    """Normalised document metadata, kept up to date at ingest time.
+
+    documents: doc_key -> stored file name, with a lowercased name column for
+    indexed prefix search. document_tags: one row per (tag, doc_key).
+    chunks: chunk id -> doc_key, so a filter resolves straight to the
+    candidate chunk ids before any vector or BM25 scoring happens.
+    """
+
+    def __init__(self, path=METADATA_INDEX_FILE):
+        self._lock = threading.Lock()
+        self._conn = open_store(path)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS documents (doc_key TEXT PRIMARY KEY, pdf_name TEXT, name TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_documents_name ON documents (name);
+            CREATE TABLE IF NOT EXISTS document_tags (
+                tag TEXT NOT NULL, doc_key TEXT NOT NULL, PRIMARY KEY (tag, doc_key));
+            CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, doc_key TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks (doc_key);
+        ''')
+        self._conn.commit()
+
+    def _set_documents(self, chunks):
+        documents = {}
+        for chunk in chunks:
+            metadata = chunk['metadata']
+            documents[metadata.get('doc_key', metadata.get('pdf_name'))] = metadata
+        for doc_key, metadata in documents.items():
+            # Chunks from before doc_name existed used the base name as doc_key
+            self._conn.execute(
+                'INSERT OR REPLACE INTO documents (doc_key, pdf_name, name) VALUES (?, ?, ?)',
+                (doc_key, metadata.get('pdf_name'), metadata.get('doc_name', doc_key).lower())
+            )
+            self._conn.execute('DELETE FROM document_tags WHERE doc_key = ?', (doc_key,))
+            self._conn.executemany(
+                'INSERT INTO document_tags (tag, doc_key) VALUES (?, ?)',
+                [(tag, doc_key) for tag in normalize_tags(metadata.get('tags'))]
+            )
+
+    # Ingestion listener interface (see utils.ingest_pipeline.ingest_pdf)
+    def on_added(self, chunks):
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO chunks (id, doc_key) VALUES (?, ?)',
+                [(chunk['id'], chunk['metadata'].get('doc_key', chunk['metadata'].get('pdf_name'))) for chunk in chunks]
+            )
+            self._set_documents(chunks)
+            self._conn.commit()
+
+    def on_updated(self, chunks):
+        with self._lock:
+            self._set_documents(chunks)
+            self._conn.commit()
+
+    def on_removed(self, chunks):
+        with self._lock:
+            self._conn.executemany('DELETE FROM chunks WHERE id = ?', [(chunk['id'],) for chunk in chunks])
+            # Forget documents that no longer have any chunks
+            for doc_key in {chunk['metadata'].get('doc_key', chunk['metadata'].get('pdf_name')) for chunk in chunks}:
+                if self._conn.execute('SELECT 1 FROM chunks WHERE doc_key = ? LIMIT 1', (doc_key,)).fetchone() is None:
+                    self._conn.execute('DELETE FROM documents WHERE doc_key = ?', (doc_key,))
+                    self._conn.execute('DELETE FROM document_tags WHERE doc_key = ?', (doc_key,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM chunks LIMIT 1').fetchone() is None
+
+    def rebuild(self, collection, page_size=1000):
+        """One-off backfill from chunks already in the collection.
+
+        Chunks stored before doc_key existed get it written back to the
+        collection (their file name, the key the indexes already use for
+        them), so `where={'doc_key': ...}` filters don't silently drop them.
+        """
+        from utils.chroma_manager import iter_collection
+        with self._lock:
+            self._conn.executescript('DELETE FROM documents; DELETE FROM document_tags; DELETE FROM chunks;')
+        for chunks in iter_collection(collection, ['metadatas'], page_size):
+            legacy = [chunk for chunk in chunks if 'doc_key' not in chunk['metadata'] and chunk['metadata'].get('pdf_name')]
+            if legacy:
+                for chunk in legacy:
+                    chunk['metadata'] = dict(chunk['metadata'], doc_key=chunk['metadata']['pdf_name'])
+                collection.update(ids=[chunk['id'] for chunk in legacy], metadatas=[chunk['metadata'] for chunk in legacy])
+            self.on_added(chunks)
+        with self._lock:
+            self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self._conn.commit()
+
+    def data_version(self):
+        """Changes whenever another connection (e.g. another process) commits to the index."""
+        with self._lock:
+            return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def is_current(self):
+        with self._lock:
+            return self._conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION
+
+    def find_documents(self, pdf_name=None, tags=None):
+        """doc_keys whose name starts with pdf_name (case-insensitive, or equals the stored
+        file name) and that carry any of the tags."""
+        conditions, params = [], []
+        if pdf_name:
+            prefix = pdf_name.lower()
+            conditions.append('(d.name >= ? AND d.name < ? OR d.pdf_name = ?)')
+            params += [prefix, _prefix_upper_bound(prefix), pdf_name]
+        tags = normalize_tags(tags)
+        if tags:
+            conditions.append(
+                f'd.doc_key IN (SELECT doc_key FROM document_tags WHERE tag IN ({",".join("?" for _ in tags)}))'
+            )
+            params += tags
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT d.doc_key FROM documents d WHERE {" AND ".join(conditions) or "1"}', params
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def chunk_ids(self, doc_keys):
+        """Set of chunk ids belonging to the given documents."""
+        ids = set()
+        doc_keys = list(doc_keys)
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(doc_keys), 500):
+                batch = doc_keys[start:start + 500]
+                ids.update(row[0] for row in self._conn.execute(
+                    f'SELECT id FROM chunks WHERE doc_key IN ({",".join("?" for _ in batch)})', batch
+                ))
+        return ids
+
+    def known_chunks(self, ids):
+        """The subset of `ids` present in the index."""
+        known = set()
+        ids = list(ids)
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                known.update(row[0] for row in self._conn.execute(
+                    f'SELECT id FROM chunks WHERE id IN ({",".join("?" for _ in batch)})', batch
+                ))
+        return known
+
+    def list_documents(self):
+        """(doc_key, pdf_name) of every stored document, by name."""
+        with self._lock:
+            return self._conn.execute('SELECT doc_key, pdf_name FROM documents ORDER BY name, pdf_name').fetchall()
+
+    def chunk_counts(self):
+        """(pdf_name, chunk count) of every stored document, by file name."""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT d.pdf_name, COUNT(*) FROM chunks c JOIN documents d ON d.doc_key = c.doc_key '
+                'GROUP BY c.doc_key ORDER BY d.pdf_name'
+            ).fetchall()
+
+    def list_tags(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT DISTINCT tag FROM document_tags ORDER BY tag')]
+
+
+def get_metadata_index():
+    def create():
+        index = MetadataIndex()
+        if index.is_empty() or not index.is_current():
+            # Backfill once for chunks ingested before the index (or doc_key) existed
+            from utils.chroma_manager import get_collection
+            index.rebuild(get_collection())
+        return index
+    return get_resource('metadata_index', create)
+
+
+def resolve_filters(filters):
+    """Turn a {'pdf_name': prefix, 'tags': [...]} filter into the matching doc_keys.
+
+    Returns None when nothing is filtered, otherwise a (possibly empty) list.
+    """
+    if not filters or not (filters.get('pdf_name') or filters.get('tags')):
+        return None
+    return get_metadata_index().find_documents(pdf_name=filters.get('pdf_name'), tags=filters.get('tags'))
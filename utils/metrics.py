@@ -0,0 +1,169 @@
+# utils/metrics.py
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from opentelemetry import trace
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent samples kept per stage for percentile estimates
+RECENT_SAMPLES = 1024
+PROMETHEUS_FILE = 'data/metrics.prom'
+TRACE_FILE = 'data/traces.jsonl'
+TRACE_FILE_MAX_BYTES = 50 * 1024 * 1024
+EXPORT_INTERVAL = 15
+
+_tracer = trace.get_tracer('pdf_chatbot')
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Metrics:
+    """Per-stage latency histograms and named counters for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # stage -> {'buckets': [...], 'count', 'sum', 'recent': deque}
+        self._counters = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = {
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'count': 0, 'sum': 0.0,
+                    'recent': deque(maxlen=RECENT_SAMPLES)
+                }
+            histogram['buckets'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['recent'].append(seconds)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        """{'stages': {stage: count/mean/p50/p95/p99 in seconds}, 'counters': {...}}."""
+        with self._lock:
+            stages = {}
+            for stage, histogram in sorted(self._histograms.items()):
+                ordered = sorted(histogram['recent'])
+                stages[stage] = {
+                    'count': histogram['count'],
+                    'mean': histogram['sum'] / histogram['count'],
+                    'p50': _percentile(ordered, 0.50),
+                    'p95': _percentile(ordered, 0.95),
+                    'p99': _percentile(ordered, 0.99),
+                }
+            return {'stages': stages, 'counters': dict(sorted(self._counters.items()))}
+
+    def render_prometheus(self):
+        """Text exposition format: one latency histogram labelled by stage, plus counters."""
+        lines = [
+            '# HELP pdf_chatbot_stage_seconds Latency of pipeline stages.',
+            '# TYPE pdf_chatbot_stage_seconds histogram',
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram['buckets']):
+                    cumulative += count
+                    lines.append(f'pdf_chatbot_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'pdf_chatbot_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+                lines.append(f'pdf_chatbot_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+            for name, value in sorted(self._counters.items()):
+                lines.append(f'# TYPE pdf_chatbot_{name}_total counter')
+                lines.append(f'pdf_chatbot_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path=PROMETHEUS_FILE):
+        """Atomically (re)write the metrics file, e.g. for node_exporter's textfile collector."""
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_file = f"{path}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(temp_file, path)
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Process-wide Metrics instance."""
+    return _metrics
+
+
+def record_timings(timings):
+    """Record (stage, seconds) pairs measured elsewhere, e.g. in a worker process."""
+    for stage, seconds in timings:
+        _metrics.observe(stage, seconds)
+
+
+@contextmanager
+def span(stage, **attributes):
+    """Time a block as `stage`: recorded in the latency histogram and emitted as an OpenTelemetry span."""
+    start = time.perf_counter()
+    with _tracer.start_as_current_span(stage, attributes=attributes):
+        try:
+            yield
+        except Exception:
+            _metrics.increment(f'{stage}_errors')
+            raise
+        finally:
+            _metrics.observe(stage, time.perf_counter() - start)
+
+
+_exporters_lock = threading.Lock()
+_exporters_started = False
+
+
+def start_exporters(prometheus_file=PROMETHEUS_FILE, trace_file=TRACE_FILE, interval=EXPORT_INTERVAL):
+    """Once per process: write spans as OTLP JSON lines to trace_file and refresh
+    the Prometheus file every `interval` seconds."""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+    class JsonLinesSpanExporter(SpanExporter):
+        """Appends finished spans to a file, one JSON document per line, rotating at TRACE_FILE_MAX_BYTES."""
+
+        def __init__(self, path):
+            self.path = path
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+        def export(self, spans):
+            if os.path.exists(self.path) and os.path.getsize(self.path) > TRACE_FILE_MAX_BYTES:
+                os.replace(self.path, f"{self.path}.1")
+            with open(self.path, 'a') as f:
+                for finished in spans:
+                    f.write(finished.to_json(indent=None) + '\n')
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self):
+            pass
+
+    provider = TracerProvider()
+    provider.add_span_processor(BatchSpanProcessor(JsonLinesSpanExporter(trace_file)))
+    trace.set_tracer_provider(provider)
+
+    def export_loop():
+        while True:
+            time.sleep(interval)
+            _metrics.write_prometheus(prometheus_file)
+
+    threading.Thread(target=export_loop, name='metrics-exporter', daemon=True).start()
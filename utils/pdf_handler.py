@@ -1,30 +1,25 @@
 # utils/pdf_handler.py
 import os
 import hashlib
+import socket
+import uuid
 from datetime import datetime
-import pdfplumber
-import pytesseract
-from PIL import Image
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings.openai import OpenAIEmbeddings
-from tqdm import tqdm
-from utils.chroma_manager import get_chroma_client
-from utils.security import encrypt_pdf
+from utils.chroma_manager import get_collection
+from utils.embedding_cache import CachedEmbeddings
+from utils.extraction import count_pages
+from utils.ingest_pipeline import ingest_pdf, rollback_pdf, trim_partial_page
+from utils.resources import get_embedder
+from utils.answer_cache import get_answer_cache
+from utils.lexical_index import get_lexical_index
+from utils.term_frequencies import get_term_frequency_store
+from utils.document_index import get_document_index
+from utils.metadata_index import get_metadata_index, normalize_tags
+from utils.security import open_pdf
+from utils.upload_manifest import get_upload_manifest
+from utils.metrics import span, get_metrics
+from utils.pdf_viewer import render_page, pages_with_neighbours, count_pages as count_viewer_pages
 import streamlit as st
 
-def extract_text_from_pdf(pdf_path):
-    text = ''
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            if page.extract_text():
-                text += page.extract_text()
-            else:
-                # Perform OCR
-                pil_image = page.to_image(resolution=300).original
-                ocr_text = pytesseract.image_to_string(pil_image)
-                text += ocr_text
-    return text
-
 # def compute_md5(file_path):
 #     with open(file_path, 'rb') as f:
 #         data = f.read()
@@ -118,16 +113,35 @@ def compute_md5(file_path):
 import os
 import shutil
 PDF_DIR = 'data/pdfs'
-def process_and_store_pdf(pdf_path, tags=None):
+
+def store_pdf(pdf_path, tags=None, embedder=None, on_progress=None, original_name=None, pdf_hash=None,
+              version_of=None):
+    """Headless ingestion of one PDF (no Streamlit calls), safe to run from worker threads.
+
+    Returns (status, unique_filename, counts) where status is 'stored' or
+    'duplicate'. Contents that completed, or that another run is ingesting
+    right now, count as duplicates; the content hash is claimed in the upload
+    manifest before anything is written, so concurrent runs of the same
+    content (threads or processes) never interleave. If the run
+    fails (including IngestCancelled raised from `on_progress(fraction,
+    counts)`) the chunks it wrote are rolled back; if the process dies
+    instead, the next run of the same file continues from what was stored.
+    `original_name` and `pdf_hash` can be passed when the file has already
+    been hashed and stored.
+
+    Every upload is its own document unless `version_of` names the doc_key
+    of a stored document it replaces; only then are that document's pages
+    diffed and its removed pages deleted. Matching file names alone never
+    link two uploads.
+    """
     # Step 1: Compute content-based hash
-    pdf_hash = compute_md5(pdf_path)
-    
+    pdf_hash = pdf_hash or compute_md5(pdf_path)
+
     # Step 2: Connect to vector database
-    client = get_chroma_client()
-    collection = client.get_or_create_collection('pdf_embeddings')
+    collection = get_collection()
 
-        # Step 4: Handle file saving with content-based uniqueness
-    pdf_name = os.path.basename(pdf_path)
+    # Step 3: Handle file saving with content-based uniqueness
+    pdf_name = original_name or os.path.basename(pdf_path)
     pdf_base_name, pdf_ext = os.path.splitext(pdf_name)
 
     # Ensure the directory exists before saving
@@ -136,83 +150,114 @@ def process_and_store_pdf(pdf_path, tags=None):
 
     unique_filename = f"{pdf_base_name}_{pdf_hash[:8]}{pdf_ext}"
     unique_file_path = os.path.join(PDF_DIR, unique_filename)
-    print(unique_file_path)
-    
-    # Copy the file with a unique filename in the folder
+
+    # Step 4: Claim the content. Completed contents are duplicates; chunks left
+    # by a run that never completed are continued from instead.
+    upload_manifest = get_upload_manifest()
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if upload_manifest.claim_ingest(pdf_hash, owner) != 'claimed':
+        return 'duplicate', unique_filename, {}
+    try:
+        # Copy the file with a unique filename in the folder (unless it is already stored there)
+        if os.path.abspath(pdf_path) != os.path.abspath(unique_file_path):
+            with open(pdf_path, "rb") as src_file:
+                with open(unique_file_path, "wb") as dst_file:
+                    shutil.copyfileobj(src_file, dst_file)
+
+        # The metadata index is notified last, so the chunks it knows every listener has seen
+        metadata_index = get_metadata_index()
+        listeners = [get_lexical_index(), get_term_frequency_store(), get_document_index(), metadata_index]
+        trim_partial_page(collection, pdf_hash, listeners, indexed=metadata_index.known_chunks)
+
+        # Step 5: Prepare the embedder and chunk metadata
+        embeddings = CachedEmbeddings(embedder) if embedder else get_embedder()
+        upload_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Tags are stored normalised (lowercase, de-duplicated); the metadata index splits them per tag
+        tags = ",".join(normalize_tags(tags)) or "None"
+        metadata = {
+            'doc_key': version_of or pdf_hash,
+            'doc_name': pdf_base_name,
+            'pdf_hash': pdf_hash,
+            'pdf_name': unique_filename,
+            'upload_date': upload_date,
+            'tags': tags
+        }
+
+        # Step 6: Stream changed pages through extract -> split -> embed -> upsert.
+        # With version_of, the earlier version is updated in place page by page.
+        total_pages = max(count_pages(unique_file_path), 1)
+
+        def report(counts):
+            upload_manifest.refresh_claim(pdf_hash, owner)
+            if on_progress:
+                on_progress(min(counts['extract'] / total_pages, 1.0), counts)
+
+        # Contents of the version being replaced stop being stored once its chunks are repointed or deleted
+        superseded = set()
+        if version_of:
+            previous = collection.get(where={'doc_key': version_of}, include=['metadatas'])
+            superseded = {chunk_metadata.get('pdf_hash') for chunk_metadata in previous['metadatas']} - {pdf_hash, None}
+
+        try:
+            with span('ingest_pdf', pdf_name=unique_filename):
+                counts = ingest_pdf(
+                    unique_file_path, collection, embeddings, metadata, pdf_hash,
+                    on_progress=report, listeners=listeners
+                )
+            get_metrics().increment('pages_ingested', counts['extract'])
+            upload_manifest.mark_ingested(pdf_hash, unique_filename)
+            upload_manifest.supersede(superseded)
+        except Exception:
+            rollback_pdf(collection, pdf_hash, listeners)
+            raise
+        finally:
+            # Cached answers may cite chunks that were just added, moved or removed
+            get_answer_cache().invalidate()
+        return 'stored', unique_filename, counts
+    finally:
+        upload_manifest.release_claim(pdf_hash, owner)
+
+
+def process_and_store_pdf(pdf_path, tags=None, embedder=None):
+    progress_bar = st.progress(0)
+
+    def on_progress(fraction, counts):
+        progress_bar.progress(fraction, text=f"{counts['upsert']} chunks stored")
+
     try:
-        with open(pdf_path, "rb") as src_file:
-            with open(unique_file_path, "wb") as dst_file:
-                dst_file.write(src_file.read())
-        st.success(f"PDF saved as {unique_file_path}")
+        status, unique_filename, counts = store_pdf(pdf_path, tags=tags, embedder=embedder, on_progress=on_progress)
     except Exception as e:
-        st.error(f"Error saving PDF: {e}")
+        st.error(f"Error processing PDF: {e}")
         return
 
-    # Step 3: Check if PDF content is already embedded based on content hash
-    existing = collection.get(where={'pdf_hash': pdf_hash})
-    if existing['ids']:
+    if status == 'duplicate':
         st.info(f"PDF is already embedded based on content.")
-        return
-
-
-    # Step 5: Extract text from the uniquely saved PDF
-    text = extract_text_from_pdf(unique_file_path)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    texts = text_splitter.split_text(text)
-
-    # Step 6: Generate embeddings for the extracted text
-    embeddings = OpenAIEmbeddings()
-    docs = []
-
-    # Step 7: Update metadata
-    upload_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    if tags:
-        tags = ",".join(tags)
     else:
-        tags = "None"
-
-    # Step 8: Embed text chunks and store in the vector database
-    progress_bar = st.progress(0)
-    total_chunks = len(texts)
-
-    for idx, chunk in enumerate(texts):
-        st.write(f"Processing chunk {idx}: {chunk[:50]}...")
-        embedding_vector = embeddings.embed_documents([chunk])
-
-        docs.append({
-            'id': f"{pdf_hash}_{idx}",
-            'document': chunk,
-            'metadata': {
-                'pdf_hash': pdf_hash,
-                'pdf_name': unique_filename,
-                'upload_date': upload_date,
-                'tags': tags
-            },
-            'embedding': embedding_vector[0]
-        })
-        progress_bar.progress((idx + 1) / total_chunks)
-
-    # Step 9: Store embeddings, metadata, and document in the vector database
-    collection.add(
-        documents=[doc['document'] for doc in docs],
-        metadatas=[doc['metadata'] for doc in docs],
-        ids=[doc['id'] for doc in docs],
-        embeddings=[doc['embedding'] for doc in docs]
-    )
-
-    st.success(f"{unique_filename} has been embedded and stored based on its content.")
-
-
-import base64
-
-def display_pdf(pdf_path):
-    # Read the PDF file as binary
-    with open(pdf_path, "rb") as f:
-        base64_pdf = base64.b64encode(f.read()).decode('utf-8')
-    
-    # Embed the PDF in an iframe in the Streamlit app
-    pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="700" height="1000" type="application/pdf"></iframe>'
-    st.markdown(pdf_display, unsafe_allow_html=True)
+        st.success(f"{unique_filename} has been embedded and stored based on its content.")
+
+
+def display_pdf(pdf_path, pages=None, key=None):
+    """Show the cited pages (and their neighbours) as cached images.
+
+    Only those pages are rendered; the full file is read only when the
+    user asks to download it.
+    """
+    key = key or os.path.basename(pdf_path)
+    page_count = count_viewer_pages(pdf_path)
+    pages = [page for page in (pages or []) if page <= page_count]
+    shown = pages_with_neighbours(pages, page_count)
+    st.caption(f"Showing {len(shown)} of {page_count} pages")
+    for page in shown:
+        caption = f"Page {page} (cited)" if page in pages else f"Page {page}"
+        st.image(render_page(pdf_path, page), caption=caption)
+
+    if st.button("Prepare download", key=f"prepare_{key}"):
+        st.session_state[f"download_{key}"] = True
+    if st.session_state.get(f"download_{key}"):
+        with open_pdf(pdf_path) as f:
+            st.download_button(f"📥 Download {os.path.basename(pdf_path)}", data=f,
+                               file_name=os.path.basename(pdf_path), mime="application/pdf",
+                               key=f"download_button_{key}")
 
 #     # Functions
 # def display_pdf(pdf_data):
@@ -0,0 +1,89 @@
+# utils/pdf_viewer.py
+import os
+import threading
+import pypdfium2 as pdfium
+from utils.security import is_encrypted, EncryptedReader
+
+THUMBNAIL_DIR = 'data/thumbnails'
+# Rendered page images are evicted (oldest first) beyond this total size
+THUMBNAIL_CACHE_BYTES = 200 * 1024 * 1024
+RENDER_WIDTH = 800
+# Pages shown on either side of a cited page
+NEIGHBOUR_PAGES = 1
+
+_render_lock = threading.Lock()
+
+
+def cited_pages(sources):
+    """Map pdf_name -> sorted page numbers cited by source references ({'pdf_name', 'page'} dicts)."""
+    pages = {}
+    for source in sources:
+        pdf_name = source.get('pdf_name') or 'Unknown PDF'
+        page = source.get('page')
+        pages.setdefault(pdf_name, set())
+        if page:
+            pages[pdf_name].add(page)
+    return {pdf_name: sorted(numbers) for pdf_name, numbers in pages.items()}
+
+
+def pages_with_neighbours(pages, page_count, neighbours=NEIGHBOUR_PAGES):
+    if not pages:
+        pages = [1]
+    shown = set()
+    for page in pages:
+        shown.update(range(max(1, page - neighbours), min(page_count, page + neighbours) + 1))
+    return sorted(shown)
+
+
+def open_document(pdf_path):
+    # Encrypted files are read through a seekable decrypting reader, so
+    # pdfium only decrypts the segments holding the objects it touches
+    if is_encrypted(pdf_path):
+        return pdfium.PdfDocument(EncryptedReader(pdf_path), autoclose=True)
+    return pdfium.PdfDocument(pdf_path)
+
+
+def count_pages(pdf_path):
+    # Same rule as render_page: pdfium calls never run concurrently
+    with _render_lock:
+        pdf = open_document(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+
+def render_page(pdf_path, page_number, width=RENDER_WIDTH):
+    """Path to a cached PNG of one page (1-based), rendering it on first request."""
+    if not os.path.exists(THUMBNAIL_DIR):
+        os.makedirs(THUMBNAIL_DIR)
+    image_path = os.path.join(THUMBNAIL_DIR, f"{os.path.basename(pdf_path)}_{page_number}_{width}.png")
+    if os.path.exists(image_path):
+        # Touch so eviction treats it as recently used
+        os.utime(image_path)
+        return image_path
+
+    # pdfium is not thread-safe; serialise renders across sessions
+    with _render_lock:
+        pdf = open_document(pdf_path)
+        try:
+            page = pdf[page_number - 1]
+            bitmap = page.render(scale=width / page.get_width())
+            bitmap.to_pil().save(image_path, optimize=True)
+            page.close()
+        finally:
+            pdf.close()
+    evict_thumbnails()
+    return image_path
+
+
+def evict_thumbnails(max_bytes=THUMBNAIL_CACHE_BYTES):
+    entries = [entry for entry in os.scandir(THUMBNAIL_DIR) if entry.is_file()]
+    total = sum(entry.stat().st_size for entry in entries)
+    if total <= max_bytes:
+        return
+    for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+        total -= entry.stat().st_size
+        os.remove(entry.path)
+        if total <= max_bytes:
+            return
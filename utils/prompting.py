@@ -0,0 +1,114 @@
+# utils/prompting.py
+import re
+from langchain.prompts import PromptTemplate
+from utils.resources import get_resource
+
+# Tokens of chat history and of retrieved passages sent with each question
+HISTORY_TOKEN_BUDGET = 1000
+CONTEXT_TOKEN_BUDGET = 2500
+TOKENIZER_ENCODING = 'cl100k_base'
+
+STYLE_INSTRUCTIONS = {
+    "Formal": "Use a formal, professional tone.",
+    "Informal": "Use a friendly, conversational tone.",
+    "Concise": "Answer in as few sentences as possible.",
+    "Detailed": "Give a thorough answer and explain your reasoning.",
+}
+
+ANSWER_PROMPT = PromptTemplate.from_template(
+    """Use the following pieces of context and the conversation so far to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+{style_instruction} Answer in {language}.
+
+Context:
+{context}
+
+Conversation so far:
+{history}
+
+Question: {question}
+Helpful Answer:"""
+)
+
+# Words that usually point back at earlier turns ("what about its revenue?")
+FOLLOW_UP_WORDS = frozenset((
+    'it', 'its', 'they', 'them', 'their', 'this', 'that', 'these', 'those', 'he', 'him', 'his', 'she', 'her',
+    'above', 'previous', 'earlier', 'former', 'latter', 'same', 'else', 'again', 'another',
+))
+FOLLOW_UP_OPENERS = ('and', 'or', 'but', 'so', 'also', 'what about', 'how about')
+# Questions shorter than this many words are treated as follow-ups
+MIN_STANDALONE_WORDS = 4
+
+
+def _load_token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        # Offline without a cached encoding: about four characters per token
+        return lambda text: len(text) // 4 + 1
+
+
+def count_tokens(text):
+    return get_resource('prompting.token_counter', _load_token_counter)(text)
+
+
+def is_standalone(question):
+    """Whether a question can be understood without the conversation before it."""
+    words = re.findall(r"[\w']+", question.lower())
+    if len(words) < MIN_STANDALONE_WORDS:
+        return False
+    if " ".join(words).startswith(FOLLOW_UP_OPENERS):
+        return False
+    return not FOLLOW_UP_WORDS.intersection(words)
+
+
+def format_history(chat_history, budget=HISTORY_TOKEN_BUDGET):
+    """The most recent (question, answer) turns that fit in `budget` tokens, oldest first."""
+    lines = []
+    used = 0
+    for question, answer in reversed(list(chat_history)):
+        turn = f"Human: {question}\nAssistant: {answer}"
+        tokens = count_tokens(turn)
+        if used + tokens > budget:
+            break
+        lines.append(turn)
+        used += tokens
+    omitted = len(chat_history) - len(lines)
+    if omitted:
+        lines.append(f"({omitted} earlier turns omitted)")
+    return "\n".join(reversed(lines))
+
+
+def build_context(source_documents, budget=CONTEXT_TOKEN_BUDGET):
+    """(context text, documents used) in rank order within `budget` tokens.
+
+    Repeated passage texts are included once; the last passage is cut short
+    if only part of it fits.
+    """
+    texts, used_documents = [], []
+    used = 0
+    for doc in source_documents:
+        if doc.page_content in texts:
+            continue
+        remaining = budget - used
+        tokens = count_tokens(doc.page_content)
+        if tokens > remaining:
+            if remaining > budget // 10:
+                texts.append(doc.page_content[:len(doc.page_content) * remaining // tokens])
+                used_documents.append(doc)
+            break
+        texts.append(doc.page_content)
+        used_documents.append(doc)
+        used += tokens
+    return "\n\n".join(texts), used_documents
+
+
+def build_prompt(question, context, history="", response_style="Formal", language="English"):
+    return ANSWER_PROMPT.format(
+        context=context,
+        history=history or "(none)",
+        question=question,
+        style_instruction=STYLE_INSTRUCTIONS.get(response_style, STYLE_INSTRUCTIONS["Formal"]),
+        language=language,
+    )
@@ -1,16 +1,30 @@
 # utils/recommendations.py
-from utils.chroma_manager import get_chroma_client
-from langchain.embeddings.openai import OpenAIEmbeddings
+from utils.chroma_manager import get_collection
+from utils.document_index import get_document_index
+from utils.resources import get_embedder
 
-def get_recommendations(query):
-    embeddings = OpenAIEmbeddings()
-    query_embedding = embeddings.embed_query(query)
-    client = get_chroma_client()
-    collection = client.get_or_create_collection('pdf_embeddings')
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=5,
-        include=['metadatas']
-    )
-    recommended_pdfs = [metadata['pdf_name'] for metadata in results['metadatas'][0]]
-    return set(recommended_pdfs)
\ No newline at end of file
+RECOMMENDATION_COUNT = 5
+
+
+def _document_index():
+    index = get_document_index()
+    # Backfill once for collections ingested before the index existed
+    if not len(index) and get_collection().count():
+        index.rebuild(get_collection())
+    return index
+
+
+def get_recommendations(query, k=RECOMMENDATION_COUNT):
+    """PDF names whose document centroid is closest to the query, best first."""
+    query_embedding = get_embedder().embed_query(query)
+    return [pdf_name for pdf_name, _ in _document_index().search(query_embedding, k=k)]
+
+
+def get_similar_documents(pdf_names, k=RECOMMENDATION_COUNT):
+    """'More like this': documents closest to the given stored PDFs, without any embedding or LLM call."""
+    scores = {}
+    for pdf_name in pdf_names:
+        for name, score in _document_index().similar_to(pdf_name, k=k + len(pdf_names)):
+            if name not in pdf_names:
+                scores[name] = max(score, scores.get(name, score))
+    return sorted(scores, key=scores.get, reverse=True)[:k]
@@ -0,0 +1,66 @@
+# utils/resources.py
+import threading
+from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.llms import OpenAI
+from utils.embedding_cache import CachedEmbeddings
+
+# Process-wide pool of expensive clients (Chroma client, collections, embedder, LLM).
+# Streamlit keeps imported modules alive across reruns, so entries survive
+# every rerun and are shared by all sessions.
+_resources = {}
+_lock = threading.RLock()
+
+
+def get_resource(name, factory):
+    """Return the pooled resource `name`, creating it with factory() on first use."""
+    with _lock:
+        if name not in _resources:
+            _resources[name] = factory()
+        return _resources[name]
+
+
+def register(name, instance):
+    """Install a resource explicitly, e.g. an offline embedder or fake LLM."""
+    with _lock:
+        _resources[name] = instance
+
+
+def _release(resource):
+    # Executors shut down, worker pools stop, stores close their SQLite connections
+    for method in ('shutdown', 'stop', 'close'):
+        release = getattr(resource, method, None)
+        if callable(release):
+            release()
+            return
+
+
+def invalidate(prefix=''):
+    """Drop every pooled resource whose name starts with `prefix` (all of them by default).
+
+    Each dropped resource is shut down, stopped or closed if it supports it,
+    newest first, so e.g. ingest workers stop before the job queue they use
+    is closed.
+    """
+    with _lock:
+        evicted = [_resources.pop(name) for name in [name for name in _resources if name.startswith(prefix)]]
+    # Outside the lock: a stopping worker may still need get_resource to finish its job
+    for resource in reversed(evicted):
+        _release(resource)
+
+
+def get_embedder():
+    return get_resource('embedder', lambda: CachedEmbeddings(OpenAIEmbeddings()))
+
+
+def get_llm():
+    return get_resource('llm', OpenAI)
+
+
+def warm_up():
+    """Create the client, collection, embedder, LLM and lexical index ahead of the first request."""
+    from utils.chroma_manager import get_collection
+    from utils.lexical_index import get_lexical_index
+    get_collection()
+    get_embedder()
+    get_llm()
+    get_lexical_index()
@@ -1,53 +1,267 @@
 # utils/retrieval.py
-import streamlit as st
-from utils.chroma_manager import get_chroma_client
-from langchain.llms import OpenAI
-from langchain.chains import ConversationalRetrievalChain
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.vectorstores import Chroma 
-from langchain.chains import ConversationalRetrievalChain
-from langchain.llms import OpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains.question_answering import load_qa_chain
-
-def get_retriever(filters=None):
-    client = get_chroma_client()
-    collection_name = 'pdf_embeddings'
-    embeddings = OpenAIEmbeddings()  #
-    # retriever = collection.as_retriever(search_type="mmr", search_kwargs={"k":5})
-    vectorstore = Chroma(collection_name=collection_name, embedding_function=embeddings, client=client)
-    
-    # Now you can use as_retriever()
-    retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k":1})
-
-    if filters:
-        retriever.search_kwargs['filter'] = filters
-    return retriever
-
-@st.cache_data(show_spinner=False)
-# utils/retrieval.py
-def get_answer_conversational(query, chat_history, response_style="Formal", language="English", filters=None):
-    # Define the retriever
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+import numpy as np
+from utils.chroma_manager import get_collection
+from utils.lexical_index import get_lexical_index
+from utils.metadata_index import get_metadata_index, resolve_filters
+from utils.resources import get_resource, get_embedder, get_llm
+from utils.answer_cache import get_answer_cache, make_scope
+from utils.metrics import span, get_metrics
+from utils.prompting import build_context, build_prompt, count_tokens, format_history, is_standalone
+from langchain.schema import BaseRetriever, Document
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+# Passages handed to the LLM per question
+RETRIEVAL_K = 4
+# Candidates taken from each of the dense and lexical rankings before fusion
+RETRIEVAL_FETCH_K = 20
+# Reciprocal-rank fusion damping constant
+RRF_K = 60
+# Filters matching at most this many chunks are searched exactly instead of through the ANN index
+EXACT_SEARCH_MAX_CHUNKS = 2000
+# Follow-up questions being condensed at once, alongside their first-pass retrieval
+CONDENSE_WORKERS = 4
+
+class HybridRetriever(BaseRetriever):
+    """Dense MMR hits and BM25 hits fused with reciprocal-rank fusion.
+
+    `filters` is {'pdf_name': name prefix, 'tags': [...]}; it is resolved
+    through the metadata index to candidate chunks before either search runs.
+    """
+    collection: Any
+    embedder: Any
+    lexical_index: Any
+    metadata_index: Any
+    k: int = RETRIEVAL_K
+    fetch_k: int = RETRIEVAL_FETCH_K
+    rrf_k: int = RRF_K
+    filters: Optional[dict] = None
+
+    def _candidates(self):
+        """(where clause, allowed chunk ids) for the filters; (None, None) when unfiltered,
+        and None when the filters match no document."""
+        doc_keys = resolve_filters(self.filters)
+        if doc_keys is None:
+            return None, None
+        if not doc_keys:
+            return None
+        return {'doc_key': {'$in': doc_keys}}, self.metadata_index.chunk_ids(doc_keys)
+
+    def _exact_search(self, query_embeddings, allowed_ids):
+        """Brute-force cosine ranking over a small candidate set, shaped like collection.query."""
+        empty = {key: [[] for _ in query_embeddings] for key in ('ids', 'documents', 'metadatas', 'embeddings')}
+        candidates = self.collection.get(ids=list(allowed_ids), include=['embeddings'])
+        if not candidates['ids']:
+            return empty
+        matrix = np.asarray(candidates['embeddings'], dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-10
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        # One matrix product scores every query against every candidate
+        scores = queries @ matrix.T
+        tops = [[candidates['ids'][i] for i in np.argsort(-row)[:self.fetch_k]] for row in scores]
+        found = self.collection.get(
+            ids=list({chunk_id for top in tops for chunk_id in top}), include=['documents', 'metadatas', 'embeddings']
+        )
+        by_id = {
+            chunk_id: (document, metadata, embedding) for chunk_id, document, metadata, embedding in zip(
+                found['ids'], found['documents'], found['metadatas'], found['embeddings'])
+        }
+        result = {key: [] for key in empty}
+        for top in tops:
+            result['ids'].append(top)
+            result['documents'].append([by_id[chunk_id][0] for chunk_id in top])
+            result['metadatas'].append([by_id[chunk_id][1] for chunk_id in top])
+            result['embeddings'].append([by_id[chunk_id][2] for chunk_id in top])
+        return result
+
+    def _dense_search(self, query_embeddings, where, allowed_ids):
+        """Dense candidates for several queries in one call."""
+        with span('chroma_query', queries=len(query_embeddings)):
+            if allowed_ids is not None and len(allowed_ids) <= EXACT_SEARCH_MAX_CHUNKS:
+                return self._exact_search(query_embeddings, allowed_ids)
+            return self.collection.query(
+                query_embeddings=list(query_embeddings),
+                n_results=self.fetch_k,
+                where=where,
+                include=['documents', 'metadatas', 'embeddings']
+            )
+
+    def _fuse(self, query, query_embedding, dense, position, allowed_ids):
+        """Fuse the query's dense hits (row `position` of a _dense_search result) with its BM25 hits."""
+        records = {}
+        rankings = []
+
+        # Dense candidates, reordered by maximal marginal relevance
+        dense_ids = dense['ids'][position]
+        if dense_ids:
+            order = maximal_marginal_relevance(
+                np.array(query_embedding), dense['embeddings'][position], k=len(dense_ids)
+            )
+            for chunk_id, document, metadata in zip(dense_ids, dense['documents'][position],
+                                                    dense['metadatas'][position]):
+                records[chunk_id] = (document, metadata)
+            rankings.append([dense_ids[i] for i in order])
+
+        # Lexical candidates, scored only within the same candidate chunks
+        with span('lexical_search'):
+            lexical_ids = [
+                chunk_id for chunk_id, _ in self.lexical_index.search(query, k=self.fetch_k, allowed_ids=allowed_ids)
+            ]
+        missing = [chunk_id for chunk_id in lexical_ids if chunk_id not in records]
+        if missing:
+            with span('chroma_get'):
+                found = self.collection.get(ids=missing, include=['documents', 'metadatas'])
+            for chunk_id, document, metadata in zip(found['ids'], found['documents'], found['metadatas']):
+                records[chunk_id] = (document, metadata)
+        if lexical_ids:
+            rankings.append([chunk_id for chunk_id in lexical_ids if chunk_id in records])
+
+        scores = {}
+        for ranking in rankings:
+            for rank, chunk_id in enumerate(ranking):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        best = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        return [
+            Document(id=chunk_id, page_content=records[chunk_id][0], metadata=records[chunk_id][1])
+            for chunk_id in best
+        ]
+
+    def _retrieve(self, candidates, queries, query_embeddings):
+        where, allowed_ids = candidates
+        dense = self._dense_search(query_embeddings, where, allowed_ids)
+        return [
+            self._fuse(query, query_embedding, dense, position, allowed_ids)
+            for position, (query, query_embedding) in enumerate(zip(queries, query_embeddings))
+        ]
+
+    def retrieve_batch(self, queries, query_embeddings):
+        """Documents for several queries sharing these filters, with one dense search for all of them."""
+        candidates = self._candidates()
+        if candidates is None:
+            return [[] for _ in queries]
+        return self._retrieve(candidates, queries, query_embeddings)
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        # Resolve the filters to candidate chunks before embedding anything
+        candidates = self._candidates()
+        if candidates is None:
+            return []
+        with span('embed_query'):
+            query_embedding = self.embedder.embed_query(query)
+        return self._retrieve(candidates, [query], [query_embedding])[0]
+
+def get_retriever(filters=None, k=RETRIEVAL_K):
+    return HybridRetriever(
+        collection=get_collection(),
+        embedder=get_embedder(),
+        lexical_index=get_lexical_index(),
+        metadata_index=get_metadata_index(),
+        k=k,
+        filters=filters or None
+    )
+
+def _condense(llm, question, chat_history):
+    with span('condense'):
+        return llm.invoke(CONDENSE_QUESTION_PROMPT.format(
+            chat_history=format_history(chat_history), question=question
+        )).strip()
+
+def _fuse_rankings(rankings, k):
+    """Reciprocal-rank fusion of several document rankings, keeping the first copy of each chunk."""
+    scores, documents = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            documents.setdefault(doc.id, doc)
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return [documents[doc_id] for doc_id in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+def _prepare_answer(query, chat_history, response_style, language, filters):
+    """Retrieve passages for a question and build its answer prompt.
+
+    Returns (cached, prompt, source_documents, cache_key): `cached` is an
+    (answer, source_documents) hit from the semantic answer cache, otherwise
+    None. Standalone questions (or the first question) skip condensation and
+    are embedded once for both the cache and the search. Follow-ups start a
+    first-pass search on the previous and current question while the LLM
+    condenses them; the condensed question is then searched as well and both
+    rankings are fused. Follow-up answers depend on the history, so they are
+    neither looked up in nor added to the cache (cache_key is None).
+    """
     retriever = get_retriever(filters)
+    chat_history = list(chat_history)
+    question = query
+    cache_key = None
+    if not chat_history or is_standalone(query):
+        cache_key = make_scope(filters, response_style, language)
+        with span('embed_query'):
+            query_embedding = get_embedder().embed_query(query)
+        cached = get_answer_cache().lookup(query_embedding, cache_key)
+        if cached is not None:
+            get_metrics().increment('answer_cache_hits')
+            return cached, None, cached[1], None
+        cache_key = (query_embedding, cache_key)
+        with span('retrieve'):
+            source_documents = retriever.retrieve_batch([query], [query_embedding])[0]
+    else:
+        executor = get_resource('retrieval.executor', lambda: ThreadPoolExecutor(max_workers=CONDENSE_WORKERS))
+        condensed = executor.submit(_condense, get_llm(), query, chat_history)
+        with span('retrieve'):
+            first_pass = retriever.invoke(f"{chat_history[-1][0]} {query}")
+            question = condensed.result() or query
+            source_documents = first_pass
+            if question.lower() != query.lower():
+                source_documents = _fuse_rankings([retriever.invoke(question), first_pass], retriever.k)
+
+    context, source_documents = build_context(source_documents)
+    prompt = build_prompt(question, context, format_history(chat_history), response_style, language)
+    get_metrics().increment('prompt_tokens', count_tokens(prompt))
+    return None, prompt, source_documents, cache_key
 
-    # Initialize the language model (LLM)
-    llm = OpenAI()
+# utils/retrieval.py
+def get_answer_conversational(query, chat_history, response_style="Formal", language="English", filters=None):
+    """Answer a question in one LLM round trip (two for follow-ups that need condensing).
 
-    # Initialize the ConversationalRetrievalChain
-    conversation_chain = ConversationalRetrievalChain.from_llm(
-        llm=llm,
-        retriever=retriever,
-        return_source_documents=True
+    Returns (answer, source_documents).
+    """
+    cached, prompt, source_documents, cache_key = _prepare_answer(
+        query, chat_history, response_style, language, filters
     )
+    if cached is not None:
+        return cached
+    with span('llm'):
+        answer = get_llm().invoke(prompt).strip()
+    if cache_key is not None:
+        get_answer_cache().store(cache_key[0], cache_key[1], (answer, source_documents))
+    return answer, source_documents
+
+def stream_answer_conversational(query, chat_history, response_style="Formal", language="English", filters=None):
+    """Streaming variant of get_answer_conversational.
 
-    # Get the result from the conversation chain
-    result = conversation_chain({
-        'question': query,
-        'chat_history': chat_history
-    })
+    Returns (source_documents, tokens) where tokens is a generator of answer
+    text pieces as the LLM produces them. Standalone answers are added to the
+    semantic answer cache once the generator is exhausted.
+    """
+    cached, prompt, source_documents, cache_key = _prepare_answer(
+        query, chat_history, response_style, language, filters
+    )
+    if cached is not None:
+        answer, source_documents = cached
+        return source_documents, iter([answer])
+    llm = get_llm()
 
-    # Extract the answer and source documents
-    answer = result['answer']
-    source_documents = result['source_documents']
+    def tokens():
+        pieces = []
+        start = time.perf_counter()
+        with span('llm'):
+            for piece in llm.stream(prompt):
+                if not pieces:
+                    get_metrics().observe('llm_first_token', time.perf_counter() - start)
+                pieces.append(piece)
+                yield piece
+        if cache_key is not None:
+            get_answer_cache().store(cache_key[0], cache_key[1], ("".join(pieces), source_documents))
 
-    return answer, source_documents
\ No newline at end of file
+    return source_documents, tokens()
@@ -1,33 +1,181 @@
 # utils/security.py
+import io
 import os
+import struct
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from utils.resources import get_resource, invalidate
 
 KEY_FILE = 'data/secret.key'
 
+# Segmented container: header, then fixed-size AES-GCM segments that can be
+# decrypted independently, so any byte range costs at most two segments.
+#   magic (8) | segment size (4) | nonce prefix (8) | plaintext length (8)
+#   segment i: AES-GCM(plaintext[i*size:(i+1)*size]), nonce = prefix + i,
+#              associated data = header, so segments cannot be reordered,
+#              truncated or moved between files
+MAGIC = b'PDFSEG01'
+HEADER = struct.Struct('>8sI8sQ')
+SEGMENT_SIZE = 64 * 1024
+TAG_SIZE = 16
+COPY_BLOCK_SIZE = 1024 * 1024
+
 # Generate a key and save it (do this once)
 def generate_key():
     key = Fernet.generate_key()
     with open(KEY_FILE, 'wb') as key_file:
         key_file.write(key)
+    invalidate('security.')
 
 def load_key():
-    return open(KEY_FILE, 'rb').read()
+    """The key from KEY_FILE, read from disk once per process."""
+    def read():
+        with open(KEY_FILE, 'rb') as key_file:
+            return key_file.read()
+    return get_resource('security.key', read)
+
+def get_segment_cipher():
+    """AES-256-GCM cipher for the segmented format, derived from the Fernet key."""
+    def create():
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'pdf-segments').derive(load_key())
+        return AESGCM(key)
+    return get_resource('security.segment_cipher', create)
+
+
+def is_encrypted(pdf_path):
+    with open(pdf_path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _segment_nonce(prefix, index):
+    return prefix + struct.pack('>I', index)
+
+
+def encrypt_stream(source, target, length, segment_size=SEGMENT_SIZE):
+    """Encrypt `length` bytes from the source file object into the target, one segment at a time."""
+    cipher = get_segment_cipher()
+    header = HEADER.pack(MAGIC, segment_size, os.urandom(8), length)
+    prefix = header[12:20]
+    target.write(header)
+    index = 0
+    while True:
+        segment = source.read(segment_size)
+        if not segment and index > 0:
+            break
+        target.write(cipher.encrypt(_segment_nonce(prefix, index), segment, header))
+        index += 1
+        if len(segment) < segment_size:
+            break
+
+
+def encrypt_pdf(pdf_path, segment_size=SEGMENT_SIZE):
+    """Encrypt the file in place, streaming it through a temporary file."""
+    temp_path = f"{pdf_path}.enc.tmp"
+    with open(pdf_path, 'rb') as source, open(temp_path, 'wb') as target:
+        encrypt_stream(source, target, os.path.getsize(pdf_path), segment_size)
+    os.replace(temp_path, pdf_path)
+
+
+class EncryptedReader(io.RawIOBase):
+    """Seekable, read-only file object over a segmented encrypted file.
+
+    Only the segments covering the requested range are read and decrypted;
+    the last one is kept so sequential small reads do not decrypt twice.
+    """
+
+    def __init__(self, pdf_path):
+        self._file = open(pdf_path, 'rb')
+        self._header = self._file.read(HEADER.size)
+        if len(self._header) != HEADER.size or not self._header.startswith(MAGIC):
+            self._file.close()
+            raise ValueError(f"{pdf_path} is not a segmented encrypted file")
+        _, self.segment_size, self._prefix, self.length = HEADER.unpack(self._header)
+        self._cipher = get_segment_cipher()
+        self._position = 0
+        self._cached_index = None
+        self._cached_segment = None
+
+    def _segment(self, index):
+        if index != self._cached_index:
+            self._file.seek(HEADER.size + index * (self.segment_size + TAG_SIZE))
+            encrypted = self._file.read(self.segment_size + TAG_SIZE)
+            self._cached_segment = self._cipher.decrypt(_segment_nonce(self._prefix, index), encrypted, self._header)
+            self._cached_index = index
+        return self._cached_segment
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        else:
+            position = self.length + offset
+        if position < 0:
+            raise ValueError("negative seek position")
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        written = 0
+        while written < len(view) and self._position < self.length:
+            index, offset = divmod(self._position, self.segment_size)
+            segment = self._segment(index)
+            size = min(len(segment) - offset, len(view) - written)
+            view[written:written + size] = segment[offset:offset + size]
+            written += size
+            self._position += size
+        return written
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+def read_range(pdf_path, start, length):
+    """Decrypt just the bytes [start, start + length) of an encrypted file."""
+    with EncryptedReader(pdf_path) as reader:
+        reader.seek(start)
+        return reader.read(length)
+
+
+def iter_decrypted(pdf_path, block_size=COPY_BLOCK_SIZE):
+    """Yield the plaintext in blocks without holding the whole file in memory."""
+    with EncryptedReader(pdf_path) as reader:
+        while True:
+            block = reader.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+def open_pdf(pdf_path):
+    """Binary file object with the PDF's plaintext, whether or not it is stored encrypted."""
+    if is_encrypted(pdf_path):
+        return EncryptedReader(pdf_path)
+    return open(pdf_path, 'rb')
 
-def encrypt_pdf(pdf_path):
-    key = load_key()
-    fernet = Fernet(key)
-    with open(pdf_path, 'rb') as file:
-        original = file.read()
-    encrypted = fernet.encrypt(original)
-    with open(pdf_path, 'wb') as encrypted_file:
-        encrypted_file.write(encrypted)
 
 def decrypt_pdf(pdf_path):
-    key = load_key()
-    fernet = Fernet(key)
+    """Whole plaintext of an encrypted file (segmented or legacy single Fernet token)."""
+    if is_encrypted(pdf_path):
+        return b''.join(iter_decrypted(pdf_path))
+    fernet = Fernet(load_key())
     with open(pdf_path, 'rb') as enc_file:
         encrypted = enc_file.read()
     decrypted = fernet.decrypt(encrypted)
     return decrypted
 
-# generate_key()
\ No newline at end of file
+# generate_key()
@@ -0,0 +1,17 @@
+# utils/storage.py
+import os
+import sqlite3
+
+
+def open_store(path, **connect_args):
+    """SQLite connection for a store file, shared across threads and in WAL mode.
+
+    The file's directory is created if needed; `connect_args` go to
+    sqlite3.connect (e.g. timeout, isolation_level).
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    conn = sqlite3.connect(path, check_same_thread=False, **connect_args)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
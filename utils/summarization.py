@@ -1,13 +1,111 @@
 # utils/summarization.py
-from utils.chroma_manager import get_chroma_client
-from langchain.llms import OpenAI
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from utils.chroma_manager import get_collection, iter_collection
+from utils.resources import get_llm
+
+# Per-document summaries keyed by pdf_hash, plus the last corpus summary
+SUMMARY_FILE = 'data/summaries.json'
+# Characters of text sent to the LLM per map/reduce call
+SUMMARY_INPUT_CHARS = 6000
+SUMMARY_CONCURRENCY = 4
+METADATA_PAGE_SIZE = 1000
+
+MAP_PROMPT = "Summarize the following text:\n\n{text}\n\nSummary:"
+REDUCE_PROMPT = "Combine the following summaries into a single concise summary:\n\n{text}\n\nSummary:"
+
+
+def load_summaries():
+    if os.path.exists(SUMMARY_FILE):
+        with open(SUMMARY_FILE, 'r') as f:
+            return json.load(f)
+    return {'documents': {}, 'corpus': None}
+
+
+def save_summaries(summaries):
+    temp_file = f"{SUMMARY_FILE}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(summaries, f)
+    os.replace(temp_file, SUMMARY_FILE)
+
+
+def list_documents(collection):
+    """Map pdf_hash -> pdf_name for every stored document, reading metadata only."""
+    documents = {}
+    for chunks in iter_collection(collection, ['metadatas'], METADATA_PAGE_SIZE):
+        for chunk in chunks:
+            documents[chunk['metadata']['pdf_hash']] = chunk['metadata']['pdf_name']
+    return documents
+
+
+def group_texts(texts, max_chars=SUMMARY_INPUT_CHARS):
+    """Pack consecutive texts into groups of at most max_chars (a single long text forms its own group)."""
+    group, size = [], 0
+    for text in texts:
+        if group and size + len(text) > max_chars:
+            yield "\n\n".join(group)
+            group, size = [], 0
+        group.append(text)
+        size += len(text)
+    if group:
+        yield "\n\n".join(group)
+
+
+def reduce_summaries(summaries, executor, llm):
+    """Combine summaries level by level until one remains."""
+    while len(summaries) > 1:
+        groups = list(group_texts(summaries))
+        if len(groups) == len(summaries):
+            # Every summary already fills a prompt on its own; combine pairwise
+            groups = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+        summaries = list(executor.map(lambda text: llm.invoke(REDUCE_PROMPT.format(text=text)), groups))
+    return summaries[0] if summaries else ""
+
+
+def summarize_document(collection, pdf_hash, executor, llm):
+    """Map: summarise groups of chunks in parallel. Reduce: combine into one document summary."""
+    chunks = collection.get(where={'pdf_hash': pdf_hash}, include=['documents', 'metadatas'])
+    ordered = sorted(
+        zip(chunks['ids'], chunks['documents'], chunks['metadatas']),
+        key=lambda item: (item[2].get('page', 0), item[0])
+    )
+    groups = group_texts(document for _, document, _ in ordered)
+    partials = list(executor.map(lambda text: llm.invoke(MAP_PROMPT.format(text=text)), groups))
+    return reduce_summaries(partials, executor, llm)
+
 
 def summarize_documents():
-    client = get_chroma_client()
-    collection = client.get_or_create_collection('pdf_embeddings')
-    documents = collection.get()['documents']
-    full_text = " ".join(documents)
-    llm = OpenAI()
-    prompt = f"Summarize the following text:\n\n{full_text}\n\nSummary:"
-    summary = llm(prompt)
+    collection = get_collection()
+    llm = get_llm()
+    summaries = load_summaries()
+    documents = list_documents(collection)
+
+    # Drop summaries of documents that have been replaced or removed
+    stored = summaries['documents']
+    for pdf_hash in list(stored):
+        if pdf_hash not in documents:
+            del stored[pdf_hash]
+
+    with ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY) as executor:
+        # Only documents added since the last run are summarised
+        for pdf_hash, pdf_name in documents.items():
+            if pdf_hash not in stored:
+                stored[pdf_hash] = {
+                    'pdf_name': pdf_name,
+                    'summary': summarize_document(collection, pdf_hash, executor, llm)
+                }
+                save_summaries(summaries)
+
+        corpus_key = hashlib.md5(",".join(sorted(stored)).encode('utf-8')).hexdigest()
+        corpus = summaries.get('corpus')
+        if corpus and corpus['key'] == corpus_key:
+            return corpus['summary']
+
+        doc_summaries = [stored[pdf_hash]['summary'] for pdf_hash in sorted(stored)]
+        summary = reduce_summaries(doc_summaries, executor, llm)
+
+    summaries['corpus'] = {'key': corpus_key, 'summary': summary}
+    save_summaries(summaries)
     return summary
@@ -0,0 +1,100 @@
+# utils/term_frequencies.py
+import re
+import threading
+from collections import Counter
+from wordcloud import STOPWORDS
+from utils.resources import get_resource
+from utils.storage import open_store
+
+TERM_FREQUENCY_FILE = 'data/term_frequencies.sqlite'
+WORD_PATTERN = re.compile(r"[a-z][a-z']{2,}")
+
+
+def count_terms(text):
+    return Counter(word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS)
+
+
+class TermFrequencyStore:
+    """Word counts per document (doc_key) and across the corpus, kept up to date at ingest time."""
+
+    def __init__(self, path=TERM_FREQUENCY_FILE):
+        self._lock = threading.Lock()
+        self._conn = open_store(path)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS doc_terms (
+                doc_key TEXT NOT NULL, term TEXT NOT NULL, count INTEGER NOT NULL,
+                PRIMARY KEY (doc_key, term));
+            CREATE TABLE IF NOT EXISTS global_terms (term TEXT PRIMARY KEY, count INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_global_count ON global_terms (count);
+        ''')
+        self._conn.commit()
+
+    def _apply(self, chunks, sign):
+        per_doc = {}
+        for chunk in chunks:
+            doc_key = chunk['metadata'].get('doc_key', chunk['metadata'].get('pdf_name'))
+            per_doc.setdefault(doc_key, Counter()).update(count_terms(chunk['document']))
+        with self._lock:
+            for doc_key, counts in per_doc.items():
+                rows = [(doc_key, term, sign * count) for term, count in counts.items()]
+                self._conn.executemany(
+                    'INSERT INTO doc_terms (doc_key, term, count) VALUES (?, ?, ?) '
+                    'ON CONFLICT (doc_key, term) DO UPDATE SET count = count + excluded.count', rows
+                )
+                self._conn.executemany(
+                    'INSERT INTO global_terms (term, count) VALUES (?, ?) '
+                    'ON CONFLICT (term) DO UPDATE SET count = count + excluded.count',
+                    [(term, count) for _, term, count in rows]
+                )
+            if sign < 0:
+                self._conn.execute('DELETE FROM doc_terms WHERE count <= 0')
+                self._conn.execute('DELETE FROM global_terms WHERE count <= 0')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Ingestion listener interface (see utils.ingest_pipeline.ingest_pdf)
+    def on_added(self, chunks):
+        self._apply(chunks, 1)
+
+    def on_removed(self, chunks):
+        self._apply(chunks, -1)
+
+    def on_updated(self, chunks):
+        # Reused chunks keep their text, so their counts are unchanged
+        pass
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM global_terms LIMIT 1').fetchone() is None
+
+    def rebuild(self, collection, page_size=1000):
+        """One-off backfill from chunks already in the collection."""
+        from utils.chroma_manager import iter_collection
+        with self._lock:
+            self._conn.executescript('DELETE FROM doc_terms; DELETE FROM global_terms;')
+        for chunks in iter_collection(collection, ['documents', 'metadatas'], page_size):
+            self.on_added(chunks)
+
+    def top_terms(self, limit=200, doc_keys=None):
+        """Most frequent terms as {term: count}, optionally restricted to some documents
+        (see utils.metadata_index.resolve_filters)."""
+        with self._lock:
+            if doc_keys is None:
+                rows = self._conn.execute(
+                    'SELECT term, count FROM global_terms ORDER BY count DESC LIMIT ?', (limit,)
+                ).fetchall()
+                return dict(rows)
+            if not doc_keys:
+                return {}
+            rows = self._conn.execute(
+                f'SELECT term, SUM(count) AS total FROM doc_terms WHERE doc_key IN ({",".join("?" for _ in doc_keys)}) '
+                'GROUP BY term ORDER BY total DESC LIMIT ?', list(doc_keys) + [limit]
+            ).fetchall()
+            return dict(rows)
+
+
+def get_term_frequency_store():
+    return get_resource('term_frequencies', TermFrequencyStore)
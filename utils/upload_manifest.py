@@ -0,0 +1,229 @@
+# utils/upload_manifest.py
+import hashlib
+import os
+import threading
+import time
+from utils.resources import get_resource
+from utils.storage import open_store
+
+MANIFEST_FILE = 'data/uploads.sqlite'
+HASH_BLOCK_SIZE = 1024 * 1024
+# An ingest claim not refreshed for this many seconds belongs to a run that died
+INGEST_CLAIM_TIMEOUT = 300
+
+
+class UploadManifest:
+    """Remembers every upload by its upload id and content hash.
+
+    Streamlit reruns hand the same UploadedFile back on every interaction;
+    the manifest lets those reruns return immediately instead of writing,
+    hashing and queueing the file again. It also records which contents
+    finished ingesting, so chunks left by a failed or killed run never make
+    a file look like a duplicate, and which contents are being ingested right
+    now, so two runs (threads or processes) never ingest the same content at
+    once.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self._lock = threading.Lock()
+        self._conn = open_store(path)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS uploads (
+                upload_id TEXT PRIMARY KEY,
+                pdf_hash TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                stored_path TEXT,
+                job_id INTEGER,
+                created REAL NOT NULL)
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_hash ON uploads (pdf_hash)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS ingested (pdf_hash TEXT PRIMARY KEY, pdf_name TEXT, completed REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS ingesting (pdf_hash TEXT PRIMARY KEY, owner TEXT NOT NULL, heartbeat REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def by_upload_id(self, upload_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT pdf_hash, stored_path, job_id FROM uploads WHERE upload_id = ?', (upload_id,)
+            ).fetchone()
+        return row
+
+    def by_hash(self, pdf_hash):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT pdf_hash, stored_path, job_id FROM uploads WHERE pdf_hash = ? AND stored_path IS NOT NULL',
+                (pdf_hash,)
+            ).fetchone()
+        return row
+
+    def record(self, upload_id, pdf_hash, file_name, stored_path=None, job_id=None):
+        # Recording a known upload again keeps the stored path and job it already has
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO uploads (upload_id, pdf_hash, file_name, stored_path, job_id, created) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (upload_id) DO UPDATE SET '
+                'pdf_hash = excluded.pdf_hash, file_name = excluded.file_name, '
+                'stored_path = COALESCE(excluded.stored_path, uploads.stored_path), '
+                'job_id = COALESCE(excluded.job_id, uploads.job_id), created = excluded.created',
+                (upload_id, pdf_hash, file_name, stored_path, job_id, time.time())
+            )
+            self._conn.commit()
+
+    def claim_ingest(self, pdf_hash, owner, timeout=INGEST_CLAIM_TIMEOUT):
+        """Atomically claim a content for ingesting: 'claimed', 'ingested' or 'busy'.
+
+        'busy' means another live run holds the claim; a claim whose owner
+        stopped refreshing it for `timeout` seconds is taken over.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            if self._conn.execute('SELECT 1 FROM ingested WHERE pdf_hash = ?', (pdf_hash,)).fetchone():
+                return 'ingested'
+            cursor = self._conn.execute(
+                'INSERT INTO ingesting (pdf_hash, owner, heartbeat) VALUES (?, ?, ?) '
+                'ON CONFLICT (pdf_hash) DO UPDATE SET owner = excluded.owner, heartbeat = excluded.heartbeat '
+                'WHERE ingesting.heartbeat < ?',
+                (pdf_hash, owner, now, now - timeout)
+            )
+        return 'claimed' if cursor.rowcount == 1 else 'busy'
+
+    def refresh_claim(self, pdf_hash, owner):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE ingesting SET heartbeat = ? WHERE pdf_hash = ? AND owner = ?', (time.time(), pdf_hash, owner)
+            )
+
+    def release_claim(self, pdf_hash, owner):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM ingesting WHERE pdf_hash = ? AND owner = ?', (pdf_hash, owner))
+
+    def mark_ingested(self, pdf_hash, pdf_name=None):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ingested (pdf_hash, pdf_name, completed) VALUES (?, ?, ?)',
+                (pdf_hash, pdf_name, time.time())
+            )
+            self._conn.commit()
+
+    def supersede(self, pdf_hashes):
+        """Forget contents a new version replaced, so uploading one again (e.g. to revert) ingests it again."""
+        pdf_hashes = list(pdf_hashes)
+        if not pdf_hashes:
+            return
+        placeholders = ','.join('?' * len(pdf_hashes))
+        with self._lock, self._conn:
+            self._conn.execute(f'DELETE FROM ingested WHERE pdf_hash IN ({placeholders})', pdf_hashes)
+            # Keep the upload ids so Streamlit reruns still see those uploads as handled
+            self._conn.execute(
+                f'UPDATE uploads SET stored_path = NULL, job_id = NULL WHERE pdf_hash IN ({placeholders})', pdf_hashes
+            )
+
+    def is_ingested(self, pdf_hash):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM ingested WHERE pdf_hash = ?', (pdf_hash,)).fetchone() is not None
+
+    def has_ingested(self):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM ingested LIMIT 1').fetchone() is not None
+
+    def backfill_ingested(self, collection, page_size=1000):
+        """One-off: mark every content already in the collection as ingested."""
+        from utils.chroma_manager import iter_collection
+        seen = set()
+        for chunks in iter_collection(collection, ['metadatas'], page_size):
+            for chunk in chunks:
+                metadata = chunk['metadata']
+                if metadata.get('pdf_hash') and metadata['pdf_hash'] not in seen:
+                    seen.add(metadata['pdf_hash'])
+                    self.mark_ingested(metadata['pdf_hash'], metadata.get('pdf_name'))
+
+
+def hash_buffer(buffer, block_size=HASH_BLOCK_SIZE):
+    """MD5 of an in-memory buffer, fed block by block through a memoryview (no copies)."""
+    view = memoryview(buffer)
+    hash_md5 = hashlib.md5()
+    for start in range(0, len(view), block_size):
+        hash_md5.update(view[start:start + block_size])
+    return hash_md5.hexdigest()
+
+
+def check_known_content(upload_id, pdf_hash, file_name):
+    """(status, job_id) if this content is already ingested or queued, else None.
+
+    Known contents are recorded under `upload_id`; a failed or cancelled job
+    for the content is queued again instead of reporting a duplicate.
+    """
+    from utils.jobs import get_job_queue, FAILED, CANCELLED
+
+    manifest = get_upload_manifest()
+    if manifest.is_ingested(pdf_hash):
+        manifest.record(upload_id, pdf_hash, file_name)
+        return 'duplicate', None
+    known = manifest.by_hash(pdf_hash)
+    if known is None:
+        return None
+    manifest.record(upload_id, pdf_hash, file_name, job_id=known[2])
+    job_queue = get_job_queue()
+    job = job_queue.get_job(known[2]) if known[2] is not None else None
+    if job is not None and job['status'] in (FAILED, CANCELLED):
+        job_queue.retry(job['id'])
+        return 'queued', job['id']
+    return 'duplicate', known[2]
+
+
+def register_upload(uploaded_file, tags=None, version_of=None):
+    """Store and enqueue an upload at most once (as a new version of `version_of`, if given).
+
+    Returns (status, job_id) with status one of:
+    'seen' (this upload was already handled), 'duplicate' (same content is
+    already stored or queued) or 'queued' (written to data/pdfs and queued,
+    or a failed earlier job for the same content queued again).
+    """
+    from utils.jobs import get_job_queue
+    from utils.pdf_handler import PDF_DIR
+
+    manifest = get_upload_manifest()
+    upload_id = uploaded_file.file_id
+    seen = manifest.by_upload_id(upload_id)
+    if seen is not None:
+        return 'seen', seen[2]
+
+    # Dedup on content before anything is written
+    buffer = uploaded_file.getbuffer()
+    pdf_hash = hash_buffer(buffer)
+    known = check_known_content(upload_id, pdf_hash, uploaded_file.name)
+    if known is not None:
+        return known
+
+    # Write the buffer straight to its final content-addressed name
+    if not os.path.exists(PDF_DIR):
+        os.makedirs(PDF_DIR)
+    base_name, ext = os.path.splitext(uploaded_file.name)
+    stored_path = os.path.join(PDF_DIR, f"{base_name}_{pdf_hash[:8]}{ext}")
+    with open(stored_path, 'wb') as f:
+        f.write(buffer)
+
+    job_id = get_job_queue().submit(
+        stored_path, tags=tags, display_name=uploaded_file.name, pdf_hash=pdf_hash, version_of=version_of
+    )
+    manifest.record(upload_id, pdf_hash, uploaded_file.name, stored_path=stored_path, job_id=job_id)
+    return 'queued', job_id
+
+
+def get_upload_manifest():
+    def create():
+        manifest = UploadManifest()
+        if not manifest.has_ingested():
+            # Backfill once for documents ingested before completions were recorded
+            from utils.chroma_manager import get_collection
+            manifest.backfill_ingested(get_collection())
+        return manifest
+    return get_resource('uploads.manifest', create)
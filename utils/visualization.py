@@ -1,14 +1,21 @@
 # utils/visualization.py
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
-from utils.chroma_manager import get_chroma_client
+from utils.chroma_manager import get_collection
+from utils.metadata_index import resolve_filters
+from utils.term_frequencies import get_term_frequency_store
 
-def generate_word_cloud():
-    client = get_chroma_client()
-    collection = client.get_or_create_collection('pdf_embeddings')
-    documents = collection.get()['documents']
-    full_text = " ".join(documents)
-    wordcloud = WordCloud(width=800, height=400).generate(full_text)
+WORD_CLOUD_MAX_WORDS = 200
+
+def generate_word_cloud(pdf_name=None, tags=None):
+    store = get_term_frequency_store()
+    if store.is_empty():
+        # Backfill once for chunks ingested before term counts were kept
+        store.rebuild(get_collection())
+    frequencies = store.top_terms(WORD_CLOUD_MAX_WORDS, doc_keys=resolve_filters({'pdf_name': pdf_name, 'tags': tags}))
+    if not frequencies:
+        return None
+    wordcloud = WordCloud(width=800, height=400, max_words=WORD_CLOUD_MAX_WORDS).generate_from_frequencies(frequencies)
     fig, ax = plt.subplots(figsize=(15, 7.5))
     ax.imshow(wordcloud, interpolation='bilinear')
     ax.axis('off')